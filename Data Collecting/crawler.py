@@ -6,27 +6,44 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException
 
-# Library to delay when loading web page
-import time
 from datetime import datetime
 
+# Libraries to fetch article details in parallel
+import queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
 # Library to work with CSV files
 import csv
 
 
+# Resources the crawler never needs; blocked through the DevTools protocol
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics*", "*doubleclick*", "*matomo*",
+]
+
+# Number of CSV rows accumulated before each writerows call
+CSV_BATCH_SIZE = 100
+
+
 def scroll_to_bottom(driver):
     last_height = driver.execute_script("return document.body.scrollHeight")
     while True:
         # Scroll down to the bottom
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        # Wait for new content to load
-        time.sleep(3)
-        # Calculate new scroll height and compare with last scroll height
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
+        # Wait for new content to grow the page; stop once it no longer does
+        try:
+            WebDriverWait(driver, 3).until(
+                lambda d: d.execute_script("return document.body.scrollHeight") > last_height
+            )
+        except TimeoutException:
             break
-        last_height = new_height
+        last_height = driver.execute_script("return document.body.scrollHeight")
 
 
 def return_number_of_pages(driver):
@@ -44,17 +61,71 @@ def return_number_of_pages(driver):
     return number_of_pages
 
 
+def extract_page_meta_texts(driver):
+    # The result list is rendered client-side (Angular SPA), so there is no
+    # static HTML to fetch directly. Instead, pull the text of every card in a
+    # single JS round-trip rather than one WebDriver call per article.
+    try:
+        return driver.execute_script(
+            "return Array.from(document.querySelectorAll('.result-list-padding > div'))"
+            ".map(e => e.innerText);"
+        )
+    except Exception as e:
+        print("An error occurred when extract page metadata: ", e)
+        return []
+
+
+def extract_page_article_urls(driver):
+    # Direct detail-page URL of every card (None when a card has no link)
+    try:
+        return driver.execute_script(
+            "return Array.from(document.querySelectorAll('.result-list-padding > div'))"
+            ".map(e => { const a = e.querySelector(\"a[href*='#/articles/']\");"
+            " return a ? a.href : null; });"
+        )
+    except Exception as e:
+        print("An error occurred when extract article links: ", e)
+        return []
+
+
+class DriverPool:
+    """A fixed set of reusable Chrome drivers shared by worker threads."""
+
+    def __init__(self, url, size=4):
+        self.size = size
+        self._drivers = [chrome_driver_setup(url) for _ in range(size)]
+        self._free = queue.Queue()
+        for driver in self._drivers:
+            self._free.put(driver)
+
+    @contextmanager
+    def acquire(self):
+        driver = self._free.get()
+        try:
+            yield driver
+        finally:
+            self._free.put(driver)
+
+    def close(self):
+        for driver in self._drivers:
+            driver.quit()
+
+
+def extract_one(pool, article_url):
+    # Open the article's own page on a pooled driver and read both tabs there
+    with pool.acquire() as driver:
+        driver.get(article_url)
+        return extract_abs_text(driver), extract_keywords(driver)
+
+
 def extract_abs_text(article):
     abs_text = ''
     try:
         abs_button = article.find_element(By.CSS_SELECTOR, "div.tab-header.ng-scope")
         abs_button.click()
 
-        time.sleep(4)
-
-        abs_content = article.find_element(
-            By.CSS_SELECTOR,
-            ".abstract p span"
+        abs_content = WebDriverWait(article, 10).until(
+            EC.visibility_of_element_located((By.CSS_SELECTOR, ".abstract p span"))
         )
         abs_text = abs_content.text
         print("Abstract got extracted.")
@@ -71,11 +142,8 @@ def extract_keywords(article):
         keyword_button = article.find_element(By.CSS_SELECTOR, "#secondary_tabs > div:nth-child(2) > div")
         keyword_button.click()
 
-        time.sleep(4)
-        
-        keyword_content = article.find_element(
-            By.CSS_SELECTOR,
-            ".keywords div"
+        keyword_content = WebDriverWait(article, 10).until(
+            EC.visibility_of_element_located((By.CSS_SELECTOR, ".keywords div"))
         )
         keyword_text = keyword_content.text
         print("Keywords got extracted.")
@@ -98,14 +166,34 @@ def click_next_page(driver):
         print("An error occurred:", e)
 
 
-def crawl_current_page(driver):
+def write_rows(csv_file, csv_writer, rows):
+    # Write a batch and push it to disk, so a crash loses at most one batch
+    if rows:
+        csv_writer.writerows(rows)
+        csv_file.flush()
+        rows.clear()
+
+
+def crawl_current_page(driver, pool=None):
     wait = WebDriverWait(driver, 30)
     scroll_to_bottom(driver)
 
-    csv_file = open("ganj_results.csv", "w", newline="", encoding="utf-8")
+    csv_file = open("ganj_results.csv", "w", newline="", encoding="utf-8", buffering=1 << 20)
     csv_writer = csv.writer(csv_file)
     csv_writer.writerow(["id", "meta_text", "abs_text", "keyword_text"])
+    # Rows are buffered and written in batches of CSV_BATCH_SIZE
+    pending = []
 
+    try:
+        crawl_pages(driver, pool, wait, csv_file, csv_writer, pending)
+    finally:
+        # Whatever stopped the crawl (pagination error, Ctrl+C), keep the rows scraped so far
+        write_rows(csv_file, csv_writer, pending)
+        csv_file.close()
+        print("CSV file closed")
+
+
+def crawl_pages(driver, pool, wait, csv_file, csv_writer, pending):
     number_of_pages = return_number_of_pages(driver)
 
     if number_of_pages == 0:
@@ -124,6 +212,18 @@ def crawl_current_page(driver):
 
             print(f"Number of article_cards on page {page_counter}: {len(article_cards) - 1}")   
 
+            # Metadata for the whole page in one call
+            meta_texts = extract_page_meta_texts(driver)
+
+            # Fan detail extraction out over the driver pool when articles have direct URLs
+            details = {}
+            if pool is not None:
+                article_urls = extract_page_article_urls(driver)
+                with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                    for i, article_url in enumerate(article_urls[:len(article_cards) - 1]):
+                        if article_url:
+                            details[i] = executor.submit(extract_one, pool, article_url)
+
             for index, article in enumerate(article_cards[:-1], start=1):
                 meta_text = ''
                 abs_text = ''
@@ -134,31 +234,58 @@ def crawl_current_page(driver):
                     print(f"Article #{article_counter}")
 
                     # Article Matadata
-                    meta_text = article.text
+                    if index - 1 < len(meta_texts):
+                        meta_text = meta_texts[index - 1]
+                    else:
+                        meta_text = article.text
                     print("Mata data got saved.")
 
-                    # Abstract
-                    abs_text = extract_abs_text(article)                   
-
-                    # Keywords
-                    keyword_text = extract_keywords(article)
+                    detail = None
+                    if index - 1 in details:
+                        # Abstract and keywords from the pooled driver
+                        try:
+                            detail = details[index - 1].result()
+                        except Exception as e:
+                            # e.g. driver.get timed out — read the tabs off the card instead
+                            print("Pooled extraction failed, falling back to the card:", e)
+                        # The extractors return '' on any error, so an empty pair is a miss too
+                        if detail is not None and not any(detail):
+                            print("Pooled extraction found nothing, falling back to the card")
+                            detail = None
+
+                    if detail is not None:
+                        abs_text, keyword_text = detail
+                    else:
+                        # Abstract
+                        abs_text = extract_abs_text(article)
+
+                        # Keywords
+                        keyword_text = extract_keywords(article)
 
                     # Save to CSV
-                    csv_writer.writerow([article_counter, meta_text, abs_text, keyword_text])
+                    pending.append([article_counter, meta_text, abs_text, keyword_text])
+                    if len(pending) >= CSV_BATCH_SIZE:
+                        write_rows(csv_file, csv_writer, pending)
                     print("Saved to CSV file")
 
                 except Exception as e:
                     print("Error in this article:", e)
             
+            # Wait for the old cards to be replaced instead of sleeping
+            first_article = article_cards[0] if article_cards else None
             click_next_page(driver)
-            time.sleep(6)
+            if first_article is not None:
+                try:
+                    wait.until(EC.staleness_of(first_article))
+                    wait.until(EC.presence_of_element_located(
+                        (By.CSS_SELECTOR, ".result-list-padding > div")
+                    ))
+                except TimeoutException:
+                    print("Next page did not load in time")
 
             page_counter += 1
             number_of_pages = return_number_of_pages(driver)
 
-    csv_file.close()
-    print("CSV file closed")
-
 
 def search(driver, prompt="هوش مصنوعی"):
     wait = WebDriverWait(driver, 20)
@@ -173,9 +300,9 @@ def search(driver, prompt="هوش مصنوعی"):
         search_box.send_keys(Keys.ENTER)
 
         # Wait for results to load
-        time.sleep(5)
-        driver.refresh()
-        time.sleep(5)
+        wait.until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".result-list-padding > div"))
+        )
 
     except Exception as e:
         print("An error occurred:", e)
@@ -219,6 +346,10 @@ def chrome_driver_setup(url):
     chrome_options.add_argument("--headless")  # Comment this line to see the browser
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
+    # Only DOM text is needed — don't render images
+    chrome_options.add_experimental_option(
+        "prefs", {"profile.managed_default_content_settings.images": 2}
+    )
 
     # Path to the ChromeDriver executable
     chrome_driver_path = r'D:\Desktop\chromedriver-win64\chromedriver.exe'
@@ -227,6 +358,10 @@ def chrome_driver_setup(url):
     service = Service(chrome_driver_path)
     driver = webdriver.Chrome(service=service, options=chrome_options)
 
+    # Block images, fonts, media and analytics at the network layer
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
     # Set window size
     driver.set_window_size(1920, 1080)
     
@@ -238,16 +373,18 @@ def main():
 
     url = "https://ganj.irandoc.ac.ir/#/"
     driver = chrome_driver_setup(url)
+    pool = DriverPool(url, size=4)
     
     try:
         search(driver, "هوش مصنوعی")
         change_number_of_views_per_page(driver, 100)
-        crawl_current_page(driver)
+        crawl_current_page(driver, pool)
 
     except Exception as e:
         print("An error occurred:", e)
 
     finally:
+        pool.close()
         driver.quit()
 
 
@@ -213,7 +213,8 @@ async function runSearch() {
     $('statusTime').textContent = elapsed + ' ثانیه';
 
     // Parser badge
-    const parserLabel = data.parser_used === 'llm' ? '🤖 LLM' : '⚙️ Regex';
+    const parserLabel = data.parser_used === 'llm'  ? '🤖 LLM'
+                      : data.parser_used === 'fast' ? '⚡ Fast' : '⚙️ Regex';
     $('statusParser').textContent = parserLabel;
     $('statusParser').className   = 'status-badge ' +
       (data.parser_used === 'llm' ? 'status-badge--llm' : 'status-badge--rule');
@@ -5,12 +5,28 @@
 #   GET  /api/models          — لیست cross-encoder های موجود
 #   POST /api/search          — جستجوی اصلی
 #   GET  /api/schema          — ستون‌های دیتابیس
+#
+# Production: run under gunicorn with one worker (models load once) and a
+# thread pool so concurrent searches share the engine:
+#   gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:5000 app:app
+# After (re)importing the documents table, run the DB setup step once:
+#   python -m search_pipeline.database
+
+import logging
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
 from flask_cors import CORS
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    print("⚠️  orjson not installed — falling back to jsonify (pip install orjson)")
+
 from Search_Pipeline import DB_PATH, FAISS_INDEX, DOC_IDS_PATH, Models, SearchEngine
 from Search_Pipeline.config import CROSS_ENCODER_REGISTRY, DEFAULT_CROSS_ENCODER
+from Search_Pipeline.database import get_schema
 from Search_Pipeline.display_persain import process_farsi_text
 
 app = Flask(__name__)
@@ -20,6 +36,7 @@ print(process_farsi_text("در حال راه‌اندازی سرور..."))
 models = Models()
 models.load_index(FAISS_INDEX, DOC_IDS_PATH)
 engine = SearchEngine(models)
+get_schema()   # warm the schema cache so /api/schema never hits the DB
 print(process_farsi_text("✅ سرور آماده‌ست.\n"))
 
 
@@ -67,44 +84,43 @@ def search():
         use_or=use_or,
         parser_mode=parser_mode,
         ce_key=ce_key,
-        verbose=True,
+        # Console trace (Farsi-shaped per result) only when INFO logging is on
+        verbose=app.logger.isEnabledFor(logging.INFO),
     )
 
-    payload = []
-    for doc, score in results:
-        payload.append({
-            "id":           doc.get("id"),
-            "title":        doc.get("title", ""),
-            "abs_text":     doc.get("abs_text", ""),
-            "keyword_text": doc.get("keyword_text", ""),
-            "degree":       doc.get("degree", ""),
-            "year":         doc.get("year", ""),
-            "doc_type":     doc.get("doc_type", ""),
-            "authors":      doc.get("authors", ""),
-            "advisors":     doc.get("advisors", ""),
-            "co_advisors":  doc.get("co_advisors", ""),
-            "university":   doc.get("university", ""),
-            "subject":      doc.get("subject", ""),
-            "score":        round(score, 4),
-        })
-
-    return jsonify({
+    meta = {
         "query":          query,
         "expanded_query": expanded_query,
         "parser_used":    parser_used,
         "or_used":        or_used,
         "ce_key":         models._ce_key,
-        "count":          len(payload),
-        "results":        payload,
-    })
+        "count":          len(results),
+    }
+
+    if not HAS_ORJSON:
+        return jsonify({**meta, "results": [_result_row(d, s) for d, s in results]})
+
+    # Stream the body: metadata first, then one orjson-encoded row at a time
+    def generate():
+        yield orjson.dumps(meta)[:-1] + b',"results":['
+        for i, (doc, score) in enumerate(results):
+            yield (b"," if i else b"") + orjson.dumps(_result_row(doc, score), option=orjson.OPT_SERIALIZE_NUMPY)
+        yield b"]}"
+
+    return app.response_class(stream_with_context(generate()), mimetype="application/json")
+
+
+def _result_row(doc: dict, score: float) -> dict:
+    # fetch_full_docs guarantees every response field is present
+    return {**doc, "score": round(score, 4)}
 
 
 @app.get("/api/schema")
 def schema():
-    from Search_Pipeline.database import get_schema
     cols = get_schema()
     return jsonify({"columns": [{"name": c, "type": t} for c, t in cols]})
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
+    # Dev server only — see the gunicorn command at the top of this file
+    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
\ No newline at end of file
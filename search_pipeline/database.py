@@ -1,37 +1,284 @@
 # Database access layer — all SQLite interactions live here.
 
+import json
 import sqlite3
+import threading
+from functools import lru_cache
+
+import numpy as np
+
 from .config import DB_PATH
 from typing import List, Tuple, Dict, Union
 
 # Column list is fetched once and cached to avoid repeated PRAGMA calls
 _cached_columns: set | None = None
+_cached_schema: list[tuple[str, str]] | None = None
+
+# Max ids bound per IN (...) query — a power of two so padded chunks stay
+# under SQLite's default 999-variable limit
+_IN_CHUNK = 512
+
+# Per-connection cache of compiled statements; SQL shapes are kept bounded
+# (id lists padded to power-of-two widths, year lists via json_each) so it stays warm
+_CACHED_STATEMENTS = 512
+
+
+# One long-lived connection per thread — Flask serves requests from a thread pool
+_local = threading.local()
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Return this thread's persistent connection, opening and tuning it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None,
+                               cached_statements=_CACHED_STATEMENTS)
+        for pragma in _PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.OperationalError:
+                # e.g. WAL cannot be enabled on a read-only file — keep the defaults
+                pass
+        _local.conn = conn
+    return conn
+
+
+# PRAGMA data_version only changes for commits made by *other* connections,
+# so it is read from one dedicated connection that never writes: then every
+# commit — another process, a WAL write the file's mtime does not show, or this
+# process's own per-thread connections — moves it.
+_version_conn: sqlite3.Connection | None = None
+_version_lock = threading.Lock()
+
+
+def db_version() -> int:
+    """Counter that changes whenever anything commits to the DB (cheap; no file I/O)."""
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        return _version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _pad_in_params(values: list) -> list:
+    """
+    Pad *values* to the next power-of-two length by repeating the last item,
+    so IN (...) lists only ever produce a handful of distinct SQL strings.
+    """
+    width = 1 << (len(values) - 1).bit_length()
+    return values + [values[-1]] * (width - len(values))
+
+
+def _to_columns(rows: List[Tuple]) -> Dict[str, Union[np.ndarray, tuple]]:
+    """
+    Turn (id, title, abs_text, keyword_text) rows into one read-only column per
+    field, so callers slice ids / texts without unpacking every row tuple.
+    """
+    ids, titles, abstracts, keywords = zip(*rows) if rows else ((), (), (), ())
+    id_array = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    id_array.flags.writeable = False   # shared through the filter cache
+    return {"ids": id_array, "titles": titles, "abs": abstracts, "kw": keywords}
+
+
+def _load_schema() -> None:
+    """Read the documents table layout once; fills both column caches."""
+    global _cached_columns, _cached_schema
+    cur = _get_conn().cursor()
+    cur.execute("PRAGMA table_info(documents)")
+    rows = cur.fetchall()
+    cur.close()
+    _cached_columns = {row[1] for row in rows}
+    _cached_schema  = [(row[1], row[2]) for row in rows]
 
 
 def get_columns() -> set:
     """Return the set of column names in the documents table (cached after first call)."""
-    global _cached_columns
     if _cached_columns is None:
-        conn = sqlite3.connect(DB_PATH)
-        cur  = conn.cursor()
-        cur.execute("PRAGMA table_info(documents)")
-        _cached_columns = {row[1] for row in cur.fetchall()}
-        conn.close()
+        _load_schema()
     return _cached_columns
 
 
-from typing import Dict, Union, List, Tuple
-import sqlite3
+def get_schema() -> list[tuple[str, str]]:
+    """Return [(column name, declared type), ...] for the documents table (cached)."""
+    if _cached_schema is None:
+        _load_schema()
+    return _cached_schema
+
+
+# ── Structured-filter indexes ────────────────────────────────────────────────
+# Only predicates a B-tree can serve get an index: year (=, BETWEEN, IN) and id
+# (fetch_full_docs' IN lookups, and documents_fts reading rows back by id).
+# degree / doc_type / university are matched with LIKE '%x%' or FTS, which no
+# B-tree index helps, so indexing them would only slow down writes.
+
+_INDEXES = (
+    ("idx_documents_year", "year"),
+    ("idx_documents_id",   "id"),
+)
+
+# Created by earlier versions; unusable by any filter, dropped on migrate()
+_DEAD_INDEXES = ("idx_documents_degree", "idx_documents_doc_type", "idx_documents_univ")
+
+
+def _create_indexes(conn: sqlite3.Connection) -> bool:
+    """Create missing filter indexes and drop dead ones; True if an index was created."""
+    cols     = get_columns()
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    for name in _DEAD_INDEXES:
+        if name in existing:
+            conn.execute(f"DROP INDEX {name}")
+
+    created = False
+    for name, col in _INDEXES:
+        if col in cols and name not in existing:
+            conn.execute(f"CREATE INDEX {name} ON documents({col})")
+            created = True
+    return created
+
+
+# ── Full-text index ──────────────────────────────────────────────────────────
+# Free-text filters (names, university, the advisor fallback on title/abstract)
+# are substring matches, LIKE '%x%'. migrate() builds documents_fts, an FTS5
+# table with the trigram tokenizer over those columns; the same LIKE patterns
+# run against it find candidates through the trigram index and are re-checked
+# against the stored text, so the matches are exactly LIKE's (partial names,
+# ZWNJ-joined forms, substrings inside words) without a full scan. Values the
+# index cannot answer (under three characters, or with LIKE wildcards) keep
+# the plain LIKE scan. Triggers keep the external-content index in step with
+# every INSERT / UPDATE / DELETE on documents.
+# Structured columns (degree, doc_type, year) keep using plain SQL predicates.
+
+_FTS_TRIGGERS = ("documents_fts_ai", "documents_fts_ad", "documents_fts_au")
+
+# Columns usable through documents_fts; None = not checked yet
+_fts_columns: set | None = None
+
+
+def _fts_index_columns() -> list[str]:
+    """Columns filters match as substrings: person / university fields plus the advisor fallbacks."""
+    cols      = get_columns()
+    fallbacks = _person_fallbacks()["advisors"] or []
+    return [c for c in ("university", "authors", "advisors", "co_advisors", *fallbacks) if c in cols]
+
+
+def _ensure_fts() -> set:
+    """
+    Return the set of columns the filters can match through documents_fts.
+
+    Read-only: the index is only used when migrate() built it with the trigram
+    tokenizer and its sync triggers are in place (they are dropped with the
+    documents table on a re-import); otherwise filters fall back to LIKE.
+    """
+    global _fts_columns
+    if _fts_columns is not None:
+        return _fts_columns
+
+    conn    = _get_conn()
+    objects = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE name LIKE 'documents_fts%'"
+    ).fetchall())
+    if "trigram" in (objects.get("documents_fts") or "") and all(t in objects for t in _FTS_TRIGGERS):
+        _fts_columns = {row[1] for row in conn.execute("PRAGMA table_info(documents_fts)")}
+    else:
+        _fts_columns = set()
+    return _fts_columns
+
+
+def _trigram_usable(value: str) -> bool:
+    """True if documents_fts can answer LIKE '%value%' (the trigram index needs 3+ literal chars)."""
+    return len(value) >= 3 and "%" not in value and "_" not in value
+
+
+@lru_cache(maxsize=256)
+def _fts_fragment(columns: tuple, n: int) -> str:
+    """
+    Return an id IN (...) fragment with one documents_fts LIKE per (column,
+    value), column-major. Each LIKE is its own SELECT: FTS5 can only use the
+    trigram index for a single LIKE constraint, and an OR scans the table.
+    """
+    selects = " UNION ALL ".join(
+        f"SELECT rowid FROM documents_fts WHERE {col} LIKE ?" for col in columns for _ in range(n)
+    )
+    return f"id IN ({selects})"
+
+
+@lru_cache(maxsize=256)
+def _like_fragment(column: str, n: int, fallbacks: tuple) -> str:
+    """
+    Return the OR-ed LIKE fragment for *n* values on *column*, or on each of
+    *fallbacks* (column-major) when given. Cached per shape.
+    """
+    targets = fallbacks or (column,)
+    return "(" + " OR ".join(f"{col} LIKE ?" for col in targets for _ in range(n)) + ")"
+
+
+# Person filter field -> fallback columns (None when the field has its own column)
+_PERSON_FALLBACKS: dict | None = None
+
+
+def _person_fallbacks() -> dict:
+    """Resolve person-field fallbacks once; column presence is fixed after startup."""
+    global _PERSON_FALLBACKS
+    if _PERSON_FALLBACKS is None:
+        cols = get_columns()
+        _PERSON_FALLBACKS = {
+            "authors":     None,
+            # Advisors fall back to abstract/title when the column is missing
+            "advisors":    ["abs_text", "title"] if "advisors" not in cols else None,
+            "co_advisors": None,
+        }
+    return _PERSON_FALLBACKS
+
+
+# ── Filtered lookup ──────────────────────────────────────────────────────────
+# Results are memoised per (filters, join_operator); the cache is dropped
+# whenever db_version() moves, i.e. on any commit to the DB.
+
+_filters_db_version: int | None = None
+
+
+def _freeze(filters: dict) -> tuple:
+    """Turn a filter dict into a hashable, order-independent key."""
+    def freeze_value(v):
+        return tuple(v) if isinstance(v, (list, tuple)) else v
+    return tuple(sorted((k, freeze_value(v)) for k, v in filters.items()))
+
 
 def apply_filters(
     filters: Dict[str, Union[str, List[str], Tuple[int, int]]],
     join_operator: str = "AND"
-) -> List[Tuple]:
-
+) -> Dict[str, Union[np.ndarray, tuple]]:
+    """
+    Return the documents matching *filters* column-wise:
+    {"ids": int64 array, "titles": tuple, "abs": tuple, "kw": tuple}.
+    """
     if join_operator not in ("AND", "OR"):
         raise ValueError("join_operator must be 'AND' or 'OR'")
 
+    global _filters_db_version, _fts_columns
+    version = db_version()
+    if version != _filters_db_version:
+        _apply_filters_cached.cache_clear()
+        _fts_columns        = None   # a re-import drops the FTS sync triggers
+        _filters_db_version = version
+
+    return _apply_filters_cached(_freeze(filters), join_operator)
+
+
+@lru_cache(maxsize=256)
+def _apply_filters_cached(frozen_filters: tuple, join_operator: str) -> Dict[str, Union[np.ndarray, tuple]]:
+    filters = dict(frozen_filters)
+
     cols = get_columns()
+    fts_cols = _ensure_fts()
     sql = "SELECT id, title, abs_text, keyword_text FROM documents WHERE 1=1"
     params: List = []
 
@@ -45,7 +292,7 @@ def apply_filters(
         values: Union[str, List[str]],
         fallback_columns: List[str] = None
     ):
-        """Add LIKE conditions for a column, with optional fallback columns."""
+        """Add LIKE/FTS conditions for a column, with optional fallback columns."""
         if not values:
             return
 
@@ -55,21 +302,21 @@ def apply_filters(
         if not value_list:
             return
 
-        if column in cols:
-            cond_parts = [f"{column} LIKE ?" for _ in value_list]
-            condition_str = f"({' OR '.join(cond_parts)})"
-            conditions.append(condition_str)
+        # Route free-text columns through the trigram index when all of them are indexed
+        match_cols = [column] if column in cols else (fallback_columns or [])
+        if (match_cols and all(c in fts_cols for c in match_cols)
+                and all(map(_trigram_usable, value_list))):
+            conditions.append(_fts_fragment(tuple(match_cols), len(value_list)))
+            condition_params.extend(f"%{v}%" for _ in match_cols for v in value_list)
+
+        elif column in cols:
+            conditions.append(_like_fragment(column, len(value_list), ()))
             condition_params.extend(f"%{v}%" for v in value_list)
 
         elif fallback_columns:
-            or_parts = []
-            for col in fallback_columns:
-                or_parts.extend(f"{col} LIKE ?" for _ in value_list)
-            if or_parts:
-                condition_str = f"({' OR '.join(or_parts)})"
-                conditions.append(condition_str)
-                # Repeat values for each fallback column
-                condition_params.extend(f"%{v}%" for v in value_list for _ in fallback_columns)
+            conditions.append(_like_fragment(column, len(value_list), tuple(fallback_columns)))
+            # One parameter per (fallback column, value), matching the fragment's order
+            condition_params.extend(f"%{v}%" for _ in fallback_columns for v in value_list)
 
     # ────────────────────────────────────────────────
     # Collect conditions without modifying sql yet
@@ -97,9 +344,9 @@ def apply_filters(
                 conditions.append("year = ?")
                 condition_params.append(exact_years[0])
             else:
-                placeholders = ", ".join(["?"] * len(exact_years))
-                conditions.append(f"year IN ({placeholders})")
-                condition_params.extend(exact_years)
+                # One JSON parameter keeps a single SQL shape for any list length
+                conditions.append("year IN (SELECT value FROM json_each(?))")
+                condition_params.append(json.dumps(exact_years))
 
     # Document type
     if "doc_type" in filters and "doc_type" in cols:
@@ -109,21 +356,10 @@ def apply_filters(
     if "university" in filters:
         add_like_condition("university", filters["university"])
 
-    # Authors
-    if "authors" in filters:
-        add_like_condition("authors", filters["authors"])
-
-    # Advisors (with fallback to abstract/title)
-    if "advisors" in filters:
-        add_like_condition(
-            "advisors",
-            filters["advisors"],
-            fallback_columns=["abs_text", "title"] if "advisors" not in cols else None
-        )
-
-    # Co-advisors
-    if "co_advisors" in filters:
-        add_like_condition("co_advisors", filters["co_advisors"])
+    # Authors / advisors / co-advisors — fallbacks resolved once from the schema
+    for field, fallback_columns in _person_fallbacks().items():
+        if field in filters:
+            add_like_condition(field, filters[field], fallback_columns=fallback_columns)
 
     # Combine all collected conditions with chosen operator
     if conditions:
@@ -131,46 +367,175 @@ def apply_filters(
         sql += " AND (" + join_str.join(conditions) + ")"
 
     # Execute query
-    conn = sqlite3.connect(DB_PATH)
+    cur = _get_conn().cursor()
     try:
-        cur = conn.cursor()
         cur.execute(sql, tuple(condition_params))
         rows = cur.fetchall()
     finally:
-        conn.close()
+        cur.close()
 
-    return rows
+    return _to_columns(rows)
 
 
 
-def fetch_full_docs(doc_ids: list[int]) -> list[dict]:
+# Column list, SQL template and missing-key defaults are derived once from the
+# cached schema on first use
+_FULL_DOC_COLS: tuple | None = None
+_FULL_DOC_SQL_TEMPLATE: str | None = None
+_FULL_DOC_MISSING: tuple = ()
+
+
+def _init_full_doc_sql() -> None:
+    global _FULL_DOC_COLS, _FULL_DOC_SQL_TEMPLATE, _FULL_DOC_MISSING
     cols = get_columns()
 
-    # Core columns that are always expected
-    select = ["title", "abs_text", "keyword_text", "degree", "year", "doc_type"]
+    # "id" leads so rows can be mapped back to the requested order
+    select = ["id", "title", "abs_text", "keyword_text", "degree", "year", "doc_type"]
 
     # Optional columns — added only if present
     for col in ["advisors", "co_advisors", "authors", "university", "subject"]:
         if col in cols:
             select.append(col)
 
-    col_str = ", ".join(select)
-    conn    = sqlite3.connect(DB_PATH)
-    cur     = conn.cursor()
-    docs    = []
-
-    for doc_id in doc_ids:
-        cur.execute(f"SELECT {col_str} FROM documents WHERE id=?", (doc_id,))
-        row = cur.fetchone()
-        if row:
-            doc = {"id": doc_id}
-            for i, col in enumerate(select):
-                doc[col] = row[i] or ""
-            # Ensure all expected keys exist with empty-string defaults
-            for key in ["abs_text", "degree", "year", "doc_type",
-                        "advisors", "co_advisors", "authors", "subject", "university"]:
-                doc.setdefault(key, "")
-            docs.append(doc)
-
-    conn.close()
-    return docs
\ No newline at end of file
+    # NULLs are coalesced in SQL, so rows need no per-field fix-up in Python
+    exprs = [col if col == "id" else f"COALESCE({col}, '') AS {col}" for col in select]
+
+    _FULL_DOC_COLS         = tuple(select)
+    _FULL_DOC_SQL_TEMPLATE = (
+        f"SELECT {', '.join(exprs)} FROM documents WHERE id IN ({{placeholders}})"
+    )
+    # Expected keys the schema lacks — filled with empty-string defaults
+    _FULL_DOC_MISSING = tuple(
+        key for key in ("abs_text", "degree", "year", "doc_type", "advisors",
+                        "co_advisors", "authors", "subject", "university")
+        if key not in select
+    )
+
+
+def fetch_full_docs(doc_ids: list[int]) -> list[dict]:
+    """Fetch full document rows for *doc_ids*, preserving the caller's order."""
+    if not doc_ids:
+        return []
+
+    if _FULL_DOC_SQL_TEMPLATE is None:
+        _init_full_doc_sql()
+
+    cur = _get_conn().cursor()
+    cur.row_factory = sqlite3.Row
+    by_id: dict[int, dict] = {}
+
+    # One IN (...) query per chunk, kept under SQLite's 999-parameter limit
+    for start in range(0, len(doc_ids), _IN_CHUNK):
+        chunk = _pad_in_params(doc_ids[start:start + _IN_CHUNK])
+        cur.execute(_FULL_DOC_SQL_TEMPLATE.format(placeholders=",".join("?" * len(chunk))), chunk)
+        for row in cur.fetchall():
+            doc = dict(row)
+            for key in _FULL_DOC_MISSING:
+                doc[key] = ""
+            by_id[row["id"]] = doc
+
+    cur.close()
+    return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+
+
+# ── Corpus scan ──────────────────────────────────────────────────────────────
+
+def corpus_fingerprint() -> list:
+    """
+    Content fingerprint of the corpus for on-disk caches: [row count, max id,
+    total characters of title / abs_text / keyword_text]. One aggregate scan
+    inside SQLite; unlike the file's mtime it ignores writes that leave the
+    texts alone (ANALYZE, index builds) and sees commits still in the WAL.
+    """
+    return list(_get_conn().execute(
+        "SELECT count(*), max(id), total(length(title)), total(length(abs_text)), "
+        "total(length(keyword_text)) FROM documents"
+    ).fetchone())
+
+
+def fetch_corpus_texts() -> Dict[str, Union[np.ndarray, tuple]]:
+    """Return every document's id, title, abs_text and keyword_text column-wise, in rowid order."""
+    cur = _get_conn().cursor()
+    cur.execute("SELECT id, title, abs_text, keyword_text FROM documents")
+    rows = cur.fetchall()
+    cur.close()
+    return _to_columns(rows)
+
+
+# ── Maintenance ──────────────────────────────────────────────────────────────
+# Schema / data migrations run from an explicit setup step after the documents
+# table is (re)imported — `python -m search_pipeline.database` — never from
+# inside a search request.
+
+def _fill_text_defaults(conn: sqlite3.Connection) -> None:
+    """Store '' instead of NULL in every TEXT column."""
+    for name, col_type in get_schema():
+        if col_type.upper() == "TEXT":
+            conn.execute(f"UPDATE documents SET {name} = '' WHERE {name} IS NULL")
+
+
+def _create_fts(conn: sqlite3.Connection) -> None:
+    """
+    (Re)build documents_fts with the trigram tokenizer and its sync triggers.
+    The index is only rebuilt when the table or a trigger had to be created,
+    i.e. when it may have drifted from documents. Skipped (LIKE stays in use)
+    if this SQLite lacks FTS5 or the trigram tokenizer (3.34+).
+    """
+    indexed  = _fts_index_columns()
+    col_list = ", ".join(indexed)
+    new_vals = ", ".join(f"new.{c}" for c in indexed)
+    old_vals = ", ".join(f"old.{c}" for c in indexed)
+    delete   = (f"INSERT INTO documents_fts(documents_fts, rowid, {col_list}) "
+                f"VALUES('delete', old.id, {old_vals});")
+    insert   = f"INSERT INTO documents_fts(rowid, {col_list}) VALUES(new.id, {new_vals});"
+
+    conn.execute("SAVEPOINT fts")
+    try:
+        table   = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'documents_fts'").fetchone()
+        current = [row[1] for row in conn.execute("PRAGMA table_info(documents_fts)")]
+        fresh   = table is None or "trigram" not in table[0] or current != indexed
+        if fresh:
+            for name in _FTS_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute("DROP TABLE IF EXISTS documents_fts")
+            conn.execute(
+                f"CREATE VIRTUAL TABLE documents_fts USING fts5({col_list}, "
+                f"content='documents', content_rowid='id', tokenize='trigram')"
+            )
+
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        if fresh or not triggers.issuperset(_FTS_TRIGGERS):
+            ai, ad, au = _FTS_TRIGGERS
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {ai} AFTER INSERT ON documents BEGIN {insert} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {ad} AFTER DELETE ON documents BEGIN {delete} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {au} AFTER UPDATE ON documents BEGIN {delete} {insert} END")
+            conn.execute("INSERT INTO documents_fts(documents_fts) VALUES('rebuild')")
+        conn.execute("RELEASE fts")
+    except sqlite3.OperationalError as exc:
+        conn.execute("ROLLBACK TO fts")
+        conn.execute("RELEASE fts")
+        print(f"⚠️  Full-text index not built ({exc}) — free-text filters use LIKE scans.")
+
+
+def migrate() -> None:
+    """
+    Prepare the documents table for serving, in one transaction.
+    Raises sqlite3.Error if the DB cannot be written (e.g. read-only).
+    """
+    conn = _get_conn()
+    conn.execute("BEGIN")
+    try:
+        _fill_text_defaults(conn)
+        # Planner statistics only need refreshing when the index set changed
+        if _create_indexes(conn):
+            conn.execute("ANALYZE")
+        _create_fts(conn)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
+    print(f"✅ {DB_PATH} migrated.")
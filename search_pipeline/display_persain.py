@@ -1,7 +1,11 @@
+from functools import lru_cache
+
 from bidi.algorithm import get_display
 import arabic_reshaper
 
 # تابع برای اصلاح متن فارسی
+# نتیجه کش می‌شود — نام نویسنده/استاد/دانشگاه در نتایج مدام تکرار می‌شوند
+@lru_cache(maxsize=10_000)
 def process_farsi_text(text):
     reshaped_text = arabic_reshaper.reshape(text)  # اتصال حروف
     return get_display(reshaped_text)  # راست‌چین کردن متن
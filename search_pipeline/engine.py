@@ -6,6 +6,9 @@
 #   "llm"  — delegates to llm_parser.extract(); on failure falls back to "rule"
 #   "rule" — hand-crafted regex/fuzzy parser in query_parser.py
 #
+# Queries with no filter hints at all (no year, degree, doc type, university
+# or person trigger) skip both parsers and go straight to semantic search.
+#
 # The semantic_query that reaches the encoders is:
 #   • LLM mode  → the `keywords` field returned by the LLM
 #   • Rule mode → the original query with filter tokens stripped out
@@ -15,35 +18,95 @@
 
 from __future__ import annotations
 
+import json
 import logging
+import os
+import threading
 import time
+from functools import lru_cache
 
-import faiss
 import numpy as np
 
 from . import llm_parser
-from .config      import DEFAULT_TOP_K, MAX_EXPANSIONS, RRF_K
-from .database    import apply_filters, fetch_full_docs
+from .config      import DB_PATH, DEFAULT_TOP_K, MAX_EXPANSIONS, RRF_K
+from .database    import (
+    apply_filters, corpus_fingerprint, db_version, fetch_corpus_texts, fetch_full_docs,
+)
 from .expander    import expand
 from .normalizer  import normalize
-from .query_parser import parse_filters, strip_filter_tokens
-from .ranking     import HAS_BM25, bm25_score, reciprocal_rank_fusion
+from .query_parser import has_filter_hints, parse_filters, strip_filter_tokens
+from .ranking     import (
+    HAS_SKLEARN, BM25Vectorizer, bm25_score, rrf_top_ids,
+)
 from .display_persain import process_farsi_text
 
 log = logging.getLogger(__name__)
 
+# On-disk corpus cache (doc ids + normalised texts + BM25 sparse matrix), kept next to the DB
+_BM25_CACHE_PREFIX = os.path.splitext(DB_PATH)[0] + "_bm25"
+_BM25_IDS_PATH     = _BM25_CACHE_PREFIX + "_ids.npy"
+_CORPUS_TEXTS_PATH = _BM25_CACHE_PREFIX + "_texts.json"
+
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def _build_texts(rows: list[tuple]) -> list[str]:
-    """Concatenate title + abstract + keywords into a single normalised string."""
-    return [normalize(f"{r[1] or ''} {r[2] or ''} {r[3] or ''}") for r in rows]
+# The same documents come back for the same filters, so normalised document
+# texts are memoised on their raw concatenation (bounded: abstracts are long)
+_normalize_doc_text = lru_cache(maxsize=10_000)(normalize)
+
+
+def _build_texts(columns: dict) -> list[str]:
+    """Concatenate title + abstract + keywords into a single normalised string per document."""
+    return [
+        _normalize_doc_text(f"{title or ''} {abstract or ''} {kw or ''}")
+        for title, abstract, kw in zip(columns["titles"], columns["abs"], columns["kw"])
+    ]
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the *k* highest scores, best first (O(n) partition + sort of k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _load_text_cache(fingerprint: list) -> tuple[np.ndarray, list[str]] | None:
+    """Cached (ids, normalised texts) if they were written for *fingerprint*, else None."""
+    try:
+        with open(_CORPUS_TEXTS_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+        ids = np.load(_BM25_IDS_PATH, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get("fingerprint") != fingerprint:
+        return None
+    texts = cache["texts"]
+    return (ids, texts) if len(ids) == len(texts) else None
+
+
+class _Corpus:
+    """Full-corpus state, swapped as one object so readers never mix two loads."""
+    __slots__ = ("ids", "texts", "text_by_id", "bm25", "fingerprint")
+
+    def __init__(
+        self,
+        ids:         np.ndarray,
+        texts:       list[str],
+        bm25:        BM25Vectorizer | None,
+        fingerprint: list,
+    ):
+        self.ids         = ids
+        self.texts       = texts
+        self.text_by_id  = dict(zip(ids.tolist(), texts))
+        self.bm25        = bm25
+        self.fingerprint = fingerprint
 
 
 def _rrf_merge(list_a: list[int], list_b: list[int], limit: int) -> list[int]:
     """Merge two ranked ID lists with RRF and return the top *limit* IDs."""
-    fused = reciprocal_rank_fusion([list_a, list_b], k=RRF_K)
-    return [doc_id for doc_id, _ in sorted(fused.items(), key=lambda x: -x[1])][:limit]
+    return rrf_top_ids([list_a, list_b], limit, k=RRF_K)
 
 
 # ── Search engine ─────────────────────────────────────────────────────────────
@@ -52,7 +115,7 @@ class SearchEngine:
     """
     Hybrid search engine combining:
       • Dense retrieval  — FAISS inner-product over bi-encoder embeddings
-      • Sparse retrieval — BM25 (optional, requires rank_bm25)
+      • Sparse retrieval — BM25 (corpus matrix via scikit-learn when installed)
       • Reranking        — cross-encoder (model selectable at runtime)
 
     Two retrieval paths:
@@ -63,6 +126,12 @@ class SearchEngine:
     def __init__(self, models):
         self.models = models
 
+        # Full-corpus state, built lazily on the first search that needs it and
+        # rebuilt when the DB content changes (checked once per db_version())
+        self._corpus:         _Corpus | None = None
+        self._corpus_version: int | None     = None
+        self._corpus_lock                    = threading.Lock()
+
     # ── Public API ────────────────────────────────────────────────────────────
 
     def search(
@@ -82,68 +151,177 @@ class SearchEngine:
         if ce_key:
             self.models.set_cross_encoder(ce_key)
 
+        plan = self._plan(query, use_expand, use_or, parser_mode, verbose)
+
+        # ── SQL-only path: skip every vector/ML step ──────────────────────────
+        if plan["sql_only"]:
+            return self._sql_only_results(plan, top_k, verbose, t0)
+
+        if not plan["semantic_query"]:
+            return [], [], plan["parser_used"], plan["or_used"]
+
+        # ── Hybrid path: FAISS + BM25 + reranker ─────────────────────────────
+        candidate_ids = self._candidates(plan, top_k, use_bm25, verbose)
+
+        docs = fetch_full_docs(candidate_ids)
+        if not docs:
+            log.info("No candidate documents found.")
+            return [], plan["expanded"], plan["parser_used"], plan["or_used"]
+
+        results = self.models.rerank(plan["semantic_query"], docs)[:top_k]
+
+        if verbose:
+            self._log_results(results, time.time() - t0)
+
+        return results, plan["expanded"], plan["parser_used"], plan["or_used"]
+
+    def search_batch(
+        self,
+        queries:     list[str],
+        top_k:       int  = DEFAULT_TOP_K,
+        use_bm25:    bool = True,
+        use_expand:  bool = True,
+        use_or:      bool = False,
+        parser_mode: str  = "llm",
+        ce_key:      str  = None,
+        verbose:     bool = True,
+    ) -> list[tuple[list[tuple[dict, float]], str, str, bool]]:
+        """
+        Run search() for many queries, batching the model work across them.
+
+        Parsing, filtering and expansion stay per query; the bi-encoder is run
+        once over all expanded queries, full-index FAISS lookups share one
+        multi-row search, and all cross-encoder pairs go through one predict
+        call. Returns one search()-style tuple per query, in order.
+        """
+        t0 = time.time()
+
+        if ce_key:
+            self.models.set_cross_encoder(ce_key)
+
+        plans   = [self._plan(q, use_expand, use_or, parser_mode, verbose) for q in queries]
+        outputs = [None] * len(plans)
+
+        hybrid = []
+        for i, plan in enumerate(plans):
+            if plan["sql_only"]:
+                outputs[i] = self._sql_only_results(plan, top_k, verbose, t0)
+            elif not plan["semantic_query"]:
+                outputs[i] = ([], [], plan["parser_used"], plan["or_used"])
+            else:
+                hybrid.append(i)
+
+        if hybrid:
+            q_vecs = self.models.encode_queries([plans[i]["expanded"] for i in hybrid])
+
+            # One multi-row FAISS search for every query on the full-index path
+            full_rows = [r for r, i in enumerate(hybrid) if not plans[i]["filtered_rows"]]
+            faiss_hits = {}
+            if full_rows:
+                indices = self.models.dense_search(q_vecs[full_rows], top_k * 3)
+                for r, row in zip(full_rows, indices):
+                    faiss_hits[r] = [int(self.models.doc_ids[j]) for j in row if j >= 0]
+
+            rerank_inputs = []
+            for r, i in enumerate(hybrid):
+                candidate_ids = self._candidates(
+                    plans[i], top_k, use_bm25, verbose,
+                    q_vec=q_vecs[r:r + 1], faiss_ids=faiss_hits.get(r),
+                )
+                rerank_inputs.append((plans[i]["semantic_query"], fetch_full_docs(candidate_ids)))
+
+            for i, ranked in zip(hybrid, self.models.rerank_batch(rerank_inputs)):
+                results = ranked[:top_k]
+                if verbose:
+                    self._log_results(results, time.time() - t0)
+                outputs[i] = (results, plans[i]["expanded"], plans[i]["parser_used"], plans[i]["or_used"])
+
+        return outputs
+
+    # ── Search stages ─────────────────────────────────────────────────────────
+
+    def _plan(
+        self,
+        query:       str,
+        use_expand:  bool,
+        use_or:      bool,
+        parser_mode: str,
+        verbose:     bool,
+    ) -> dict:
+        """Parse *query*, run its SQL pre-filter and expand the semantic part."""
         query = normalize(query)
 
         filters, semantic_query, parser_used, sql_only, llm_expansions = self._parse(
             query, parser_mode, verbose
         )
 
-        # ── SQL-only path: skip every vector/ML step ──────────────────────────
         or_used = False
-        filtered_rows = []
+        filtered_rows = None
         if filters:
             filtered_rows = apply_filters(filters, "AND")
-            if not filtered_rows and use_or:
-                print("----- Using OR operator for increasing recall -----")
+            if not filtered_rows["ids"].size and use_or:
+                if verbose:
+                    print("----- Using OR operator for increasing recall -----")
                 filtered_rows = apply_filters(filters, "OR")
                 or_used = True
-
+            if not filtered_rows["ids"].size:
+                filtered_rows = None
+
+        plan = {
+            "semantic_query": semantic_query,
+            "expanded":       semantic_query,
+            "parser_used":    parser_used,
+            "sql_only":       sql_only,
+            "or_used":        or_used,
+            "filtered_rows":  filtered_rows,
+        }
         if sql_only:
-            if verbose:
-                print("   ⚡ SQL-only mode — skipping bi-encoder / reranker.")
-            docs    = fetch_full_docs([r[0] for r in filtered_rows])[:top_k]
-            results = [(doc, 0.0) for doc in docs]
-            if verbose:
-                self._log_results(results, time.time() - t0)
-            return results, "", parser_used, or_used
+            return plan
 
-        # ── Hybrid path: FAISS + BM25 + reranker ─────────────────────────────
         if use_expand and semantic_query:
-            expanded = expand(
+            plan["expanded"] = expand(
                 semantic_query,
                 self.models.bi_encoder,
                 llm_expansions=llm_expansions,
                 max_additions=MAX_EXPANSIONS,
             )
-        else:
-            expanded = semantic_query
-            if verbose:
-                print("   ⏭️ Query expansion skipped")
+        elif verbose:
+            print("   ⏭️ Query expansion skipped")
 
         if verbose:
-            self._log_query(query, semantic_query, expanded, filters, parser_used)
+            self._log_query(query, semantic_query, plan["expanded"], filters, parser_used)
 
-        if semantic_query:
-            candidate_ids = (
-                self._filtered_search(semantic_query, expanded, filtered_rows, top_k, use_bm25, verbose)
-                if filtered_rows
-                else self._full_search(semantic_query, expanded, top_k, use_bm25)
-            )
-
-            docs = fetch_full_docs(candidate_ids)
-            if not docs:
-                log.info("No candidate documents found.")
-                return [], expanded, parser_used
-            
-            results = self.models.rerank(semantic_query, docs)[:top_k]
+        return plan
 
-            if verbose:
-                self._log_results(results, time.time() - t0)
+    def _sql_only_results(self, plan: dict, top_k: int, verbose: bool, t0: float) -> tuple:
+        if verbose:
+            print("   ⚡ SQL-only mode — skipping bi-encoder / reranker.")
+        rows    = plan["filtered_rows"]
+        docs    = fetch_full_docs(rows["ids"][:top_k].tolist()) if rows else []
+        results = [(doc, 0.0) for doc in docs]
+        if verbose:
+            self._log_results(results, time.time() - t0)
+        return results, "", plan["parser_used"], plan["or_used"]
 
-            return results, expanded, parser_used, or_used
-        
-        if not semantic_query and not filtered_rows:
-            return [], [], parser_used, or_used
+    def _candidates(
+        self,
+        plan:      dict,
+        top_k:     int,
+        use_bm25:  bool,
+        verbose:   bool,
+        q_vec:     np.ndarray | None = None,
+        faiss_ids: list[int] | None  = None,
+    ) -> list[int]:
+        """Candidate ids for a hybrid plan, via the filtered or the full-index path."""
+        if plan["filtered_rows"]:
+            return self._filtered_search(
+                plan["semantic_query"], plan["expanded"], plan["filtered_rows"],
+                top_k, use_bm25, verbose, q_vec=q_vec,
+            )
+        return self._full_search(
+            plan["semantic_query"], plan["expanded"], top_k, use_bm25,
+            q_vec=q_vec, faiss_ids=faiss_ids,
+        )
 
     # ── Parsing ───────────────────────────────────────────────────────────────
 
@@ -154,6 +332,12 @@ class SearchEngine:
         verbose:     bool,
     ) -> tuple[dict, str | None, str, bool, list[str] | None]:
 
+        # Nothing to extract: the whole query is the semantic query
+        if not has_filter_hints(query):
+            if verbose:
+                print("No filter hints — skipping parser.")
+            return {}, query, "fast", False, None
+
         if parser_mode == "llm":
             if verbose:
                 print("Trying LLM parser...")
@@ -195,23 +379,29 @@ class SearchEngine:
         self,
         semantic_query: str,
         expanded:       str,
-        filtered_records:        list,
+        filtered:       dict,
         top_k:          int,
         use_bm25:       bool,
         verbose:        bool,
+        q_vec:          np.ndarray | None = None,
     ) -> list[int]:
 
-        if not filtered_records:
+        ids = filtered["ids"].tolist()
+        if not ids:
             if verbose:
                 print("   No documents matched the filters.")
             return []
 
         if verbose:
-            print(f"   SQL pre-filter: {len(filtered_records)} candidates")
+            print(f"   SQL pre-filter: {len(ids)} candidates")
 
-        ids   = [r[0] for r in filtered_records]
-        texts = _build_texts(filtered_records)
-        return self._rank_subset(expanded, ids, texts, top_k, use_bm25, semantic_query)
+        # Normalised texts come precomputed from the corpus cache; rows it does
+        # not know yet are normalised on the spot
+        text_by_id = self._load_corpus_bm25().text_by_id
+        texts = [text_by_id.get(doc_id) for doc_id in ids]
+        if None in texts:
+            texts = _build_texts(filtered)
+        return self._rank_subset(expanded, ids, texts, top_k, use_bm25, semantic_query, q_vec)
 
 
     # ── Retrieval: full-index path ────────────────────────────────────────────
@@ -222,32 +412,96 @@ class SearchEngine:
         expanded:       str,
         top_k:          int,
         use_bm25:       bool,
+        q_vec:          np.ndarray | None = None,
+        faiss_ids:      list[int] | None  = None,
     ) -> list[int]:
-        """Search the entire FAISS index, optionally fusing with global BM25."""
-        import sqlite3
-        from .config import DB_PATH
-
-        k         = top_k * 3
-        q_vec     = self.models.encode_query(expanded)
-        _, indices = self.models.index.search(q_vec, k)
-        faiss_ids  = [int(self.models.doc_ids[i]) for i in indices[0]]
-
-        if not (use_bm25 and HAS_BM25):
+        """
+        Search the entire FAISS index, optionally fusing with global BM25.
+        *q_vec* / *faiss_ids* let batched callers pass precomputed dense results.
+        """
+        k = top_k * 3
+        if faiss_ids is None:
+            if q_vec is None:
+                q_vec = self.models.encode_query(expanded)
+            indices    = self.models.dense_search(q_vec, k)
+            # FAISS pads with -1 when the index holds fewer than k vectors
+            faiss_ids  = [int(self.models.doc_ids[i]) for i in indices[0] if i >= 0]
+
+        if not use_bm25:
             return faiss_ids
 
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute(
-                "SELECT id, title, abs_text, keyword_text FROM documents"
-            ).fetchall()
-
-        all_ids   = [r[0] for r in rows]
-        all_texts = _build_texts(rows)
-        scores    = bm25_score(semantic_query, all_texts)
-        bm25_ids  = [all_ids[i] for i in np.argsort(scores)[::-1][:k]]
+        corpus = self._load_corpus_bm25()
+        if corpus.bm25 is not None:
+            scores = corpus.bm25.score(semantic_query)
+        else:
+            scores = bm25_score(semantic_query, corpus.texts)
+        bm25_ids = [int(corpus.ids[i]) for i in _top_k_indices(scores, k)]
 
         return _rrf_merge(faiss_ids, bm25_ids, limit=top_k * 3)
 
-    # ── Retrieval: rank a subset with a temporary FAISS index ────────────────
+    def _load_corpus_bm25(self) -> _Corpus:
+        """
+        Return the full-corpus state (ids, normalised texts, BM25), loading it
+        on first use and reloading it when the DB content has changed.
+
+        db_version() is checked on every call; only when it moved is the
+        content fingerprint recomputed and compared with the loaded state's.
+        A cache on disk (memory-mapped ids, normalised texts, BM25 matrix) is
+        reused while the fingerprint stored with it matches the DB's;
+        otherwise the corpus is read, normalised and fitted, and the cache is
+        rewritten.
+        """
+        version = db_version()
+        corpus  = self._corpus
+        if corpus is not None and version == self._corpus_version:
+            return corpus
+
+        with self._corpus_lock:
+            corpus = self._corpus
+            if corpus is not None and version == self._corpus_version:
+                return corpus   # another thread reloaded meanwhile
+
+            fingerprint = corpus_fingerprint()
+            if corpus is None or corpus.fingerprint != fingerprint:
+                corpus = self._build_corpus(fingerprint)
+            # Assigned together under the lock; readers only need the object
+            self._corpus         = corpus
+            self._corpus_version = version
+            return corpus
+
+    def _build_corpus(self, fingerprint: list) -> _Corpus:
+        cached = _load_text_cache(fingerprint)
+        if cached:
+            ids, texts = cached
+        else:
+            corpus = fetch_corpus_texts()
+            ids    = corpus["ids"]
+            texts  = _build_texts(corpus)
+            try:
+                np.save(_BM25_IDS_PATH, ids)
+                # Written last: the fingerprint vouches for the ids file too
+                with open(_CORPUS_TEXTS_PATH, "w", encoding="utf-8") as f:
+                    json.dump({"fingerprint": fingerprint, "texts": texts}, f, ensure_ascii=False)
+            except OSError as exc:
+                log.warning("Could not write corpus text cache: %s", exc)
+
+        bm25 = None
+        if HAS_SKLEARN and any(t.strip() for t in texts):
+            if cached and all(os.path.exists(p) for p in BM25Vectorizer.files(_BM25_CACHE_PREFIX)):
+                bm25 = BM25Vectorizer.load(_BM25_CACHE_PREFIX)
+                if bm25.fingerprint != fingerprint:
+                    bm25 = None
+            if bm25 is None:
+                bm25 = BM25Vectorizer().fit(texts)
+                bm25.fingerprint = fingerprint
+                try:
+                    bm25.save(_BM25_CACHE_PREFIX)
+                except OSError as exc:
+                    log.warning("Could not write BM25 cache: %s", exc)
+
+        return _Corpus(ids, texts, bm25, fingerprint)
+
+    # ── Retrieval: rank a subset of stored vectors ───────────────────────────
 
     def _rank_subset(
         self,
@@ -257,36 +511,39 @@ class SearchEngine:
         top_k:          int,
         use_bm25:       bool,
         semantic_query: str,
+        q_vec:          np.ndarray | None = None,
     ) -> list[int]:
-        """Build a temporary FAISS index over *texts* and rank within it."""
-        id_to_faiss_pos = {int(self.models.doc_ids[i]): i 
-                       for i in range(len(self.models.doc_ids))}
+        """Rank *ids* by dense similarity (optionally fused with BM25 over *texts*)."""
+        id_to_faiss_pos = self.models.id_to_pos
     
-        valid_ids = []
-        vecs_list = []
-        for doc_id in ids:
+        valid_ids   = []
+        valid_pos   = []
+        valid_texts = []
+        for doc_id, text in zip(ids, texts):
             pos = id_to_faiss_pos.get(doc_id)
             if pos is not None:
-                vecs_list.append(self.models.index.reconstruct(int(pos)))
+                valid_pos.append(pos)
                 valid_ids.append(doc_id)
+                valid_texts.append(text)
         
         if not valid_ids:
             return ids[:top_k]
         
-        vecs = np.array(vecs_list, dtype="float32")
-        tmp = faiss.IndexFlatIP(vecs.shape[1])
-        tmp.add(vecs)
+        # One C call into a contiguous (n, d) float32 array
+        vecs = self.models.vectors(np.asarray(valid_pos, dtype="int64"))
         
+        # Inner product over a small subset: one gemv beats a temporary FAISS index
         k = min(top_k * 3, len(valid_ids))
-        q_vec = self.models.encode_query(expanded)
-        _, fi = tmp.search(q_vec, k)
-        faiss_ids = [valid_ids[i] for i in fi[0]]
+        if q_vec is None:
+            q_vec = self.models.encode_query(expanded)
+        sims = vecs @ q_vec[0]
+        faiss_ids = [valid_ids[i] for i in _top_k_indices(sims, k)]
         
-        if not (use_bm25 and HAS_BM25):
+        if not use_bm25:
             return faiss_ids
         
-        scores = bm25_score(semantic_query, [texts[ids.index(vid)] for vid in valid_ids])
-        bm25_ids = [valid_ids[i] for i in np.argsort(scores)[::-1][:k]]
+        scores = bm25_score(semantic_query, valid_texts)
+        bm25_ids = [valid_ids[i] for i in _top_k_indices(scores, k)]
         return _rrf_merge(faiss_ids, bm25_ids, limit=top_k * 3)
     
 
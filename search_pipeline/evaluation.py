@@ -59,19 +59,30 @@ def evaluate(engine, test_cases: list, ce_key, k_precision: int = 5, k_recall: i
     """
     p_list, r_list, mrr_list = [], [], []
 
-    for tc in test_cases:
-        print(process_farsi_text(f"\n  Query: {tc['query']}"))
-        results, expanded_query, parser_used, or_used = engine.search(tc["query"],
+    # All test queries go through one batched search (shared encoder/reranker calls).
+    # Its own trace runs stage by stage across all queries, so it stays off and
+    # each query's trace is printed below, grouped with its metrics
+    outputs = engine.search_batch(
+        [tc["query"] for tc in test_cases],
         top_k=10,
         use_bm25=True,
         use_expand=True,
         use_or=False,
         parser_mode="llm",
         ce_key=ce_key,
-        verbose=True)
+        verbose=False,
+    )
 
+    for tc, (results, expanded_query, parser_used, or_used) in zip(test_cases, outputs):
         rel     = set(tc["relevant_ids"])
 
+        print(process_farsi_text(f"\n  Query: {tc['query']}"))
+        print(process_farsi_text(f"   Expanded : {expanded_query}"))
+        print(f"   Parser   : {parser_used}  |  OR fallback: {or_used}")
+        for rank, (doc, score) in enumerate(results, 1):
+            mark = "✓" if doc["id"] in rel else " "
+            print(process_farsi_text(f"   {mark} #{rank}  score={score:.4f}  id={doc['id']}  {doc['title']}"))
+
         p = precision_at_k(rel, results, k_precision)
         r = recall_at_k(rel, results, k_recall)
         m = mrr(rel, results)
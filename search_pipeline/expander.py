@@ -1,10 +1,18 @@
 from __future__ import annotations
 
 import re
+import threading
+from collections import OrderedDict
 
-import faiss
 import numpy as np
 
+# Optional: SIMD inner products without BLAS call overhead (candidate sets are tiny)
+try:
+    import simsimd
+    HAS_SIMSIMD = True
+except ImportError:
+    HAS_SIMSIMD = False
+
 
 # ── Text utilities ────────────────────────────────────────────────────────────
 
@@ -17,33 +25,79 @@ def _tokenise(text: str) -> list[str]:
 
 def _ngram_candidates(tokens: list[str], max_n: int = 2) -> list[str]:
     """Return unique 1-gram … max_n-gram candidates from *tokens*."""
-    seen, out = set(), []
-    for n in range(1, max_n + 1):
-        for i in range(len(tokens) - n + 1):
-            phrase = " ".join(tokens[i : i + n])
-            if phrase not in seen:
-                seen.add(phrase)
-                out.append(phrase)
-    return out
+    # dict.fromkeys dedups in first-seen order; unigrams are the tokens themselves
+    return list(dict.fromkeys(
+        tokens + [
+            " ".join(tokens[i : i + n])
+            for n in range(2, max_n + 1)
+            for i in range(len(tokens) - n + 1)
+        ]
+    ))
 
 
 # ── Embedding helpers ─────────────────────────────────────────────────────────
 
 def _embed(bi_encoder, texts: list[str]) -> np.ndarray:
-    """Encode *texts* with the E5-style query prefix and L2-normalise."""
-    vecs = bi_encoder.encode(
+    """Encode *texts* with the E5-style query prefix and L2-normalise (on the encoder's device)."""
+    return bi_encoder.encode(
         ["query: " + t for t in texts],
         convert_to_numpy=True,
+        normalize_embeddings=True,
         show_progress_bar=False,
         batch_size=32,
-    ).astype("float32")
-    faiss.normalize_L2(vecs)
-    return vecs
+    ).astype("float32", copy=False)
+
+
+# The same n-grams recur across queries, so their vectors are kept in an LRU
+# keyed on (encoder, text) — texts arrive already normalised by the engine.
+# Each call then runs the bi-encoder only over the texts it has not seen yet.
+# Vectors are stored as int8 (unit vectors scaled by 127): a quarter of the
+# memory, and only ever used to score expansion candidates, never the index.
+_EMBED_CACHE_SIZE = 50_000
+
+_embed_cache: OrderedDict[tuple[int, str], np.ndarray] = OrderedDict()
+_embed_lock = threading.Lock()
+
+
+def _quantize(vecs: np.ndarray) -> np.ndarray:
+    """Map L2-normalised float vectors to int8 (×127, rounded)."""
+    return np.clip(np.rint(vecs * 127), -128, 127).astype(np.int8)
+
+
+def _embed_cached(bi_encoder, texts: list[str]) -> np.ndarray:
+    """Like _embed(), but int8 and only novel texts go through the encoder (one batch)."""
+    enc_id = id(bi_encoder)
+    with _embed_lock:
+        vecs = []
+        for t in texts:
+            vec = _embed_cache.get((enc_id, t))
+            if vec is not None:
+                _embed_cache.move_to_end((enc_id, t))
+            vecs.append(vec)
+
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+    if missing:
+        new_vecs = _quantize(_embed(bi_encoder, missing))
+        new_vecs.flags.writeable = False   # rows are shared through the cache
+        fresh = dict(zip(missing, new_vecs))
+        with _embed_lock:
+            for t, vec in fresh.items():
+                _embed_cache[(enc_id, t)] = vec
+            while len(_embed_cache) > _EMBED_CACHE_SIZE:
+                _embed_cache.popitem(last=False)
+        vecs = [fresh[t] if v is None else v for t, v in zip(texts, vecs)]
+
+    return np.vstack(vecs)
 
 
 def _cosine_scores(query_vec: np.ndarray, candidate_vecs: np.ndarray) -> np.ndarray:
-    """Cosine similarity between one query vector and many candidate vectors."""
-    return (candidate_vecs @ query_vec.T).flatten()
+    """Cosine similarity between one int8 query vector and many int8 candidate vectors."""
+    if HAS_SIMSIMD:
+        # int8 cosine kernel (VNNI / AVX2 dot products); cdist returns 1 - cos
+        return 1.0 - np.asarray(simsimd.cdist(query_vec, candidate_vecs, metric="cosine")).ravel()
+    q = query_vec.astype(np.float32).ravel()
+    c = candidate_vecs.astype(np.float32)
+    return (c @ q) / np.maximum(np.linalg.norm(c, axis=1) * np.linalg.norm(q), 1e-12)
 
 
 # ── Source 2 & 3: embedding-based + KeyBERT-style ────────────────────────────
@@ -53,6 +107,7 @@ def _embedding_expansion(
     bi_encoder,
     top_n:         int   = 4,
     sim_threshold: float = 0.70,
+    query_vec:     np.ndarray | None = None,   # (1, d) query embedding, if already computed
 ) -> list[str]:
 
     tokens = _tokenise(query)
@@ -63,32 +118,35 @@ def _embedding_expansion(
     if not candidates:
         return []
 
-    all_texts  = [query] + candidates
-    embeddings = _embed(bi_encoder, all_texts)
-
-    query_vec      = embeddings[0:1]
-    candidate_vecs = embeddings[1:]
+    # Query and candidates share one forward pass unless the query is pre-encoded
+    if query_vec is None:
+        embeddings     = _embed_cached(bi_encoder, [query] + candidates)
+        query_vec      = embeddings[0:1]
+        candidate_vecs = embeddings[1:]
+    else:
+        query_vec      = _quantize(query_vec)
+        candidate_vecs = _embed_cached(bi_encoder, candidates)
     scores         = _cosine_scores(query_vec, candidate_vecs)
 
-    # Source 2: all candidates above threshold (excluding exact match with query)
-    above_threshold = [
-        candidates[i]
-        for i in range(len(candidates))
-        if scores[i] >= sim_threshold and candidates[i] != query
-    ]
-
-    # Source 3: top_n by score (KeyBERT-style)
-    top_indices = np.argsort(scores)[::-1][:top_n]
-    keybert     = [candidates[i] for i in top_indices if candidates[i] != query]
+    # Source 2: all candidates above threshold (one boolean mask, reused below)
+    above_mask      = scores >= sim_threshold
+    above_threshold = np.flatnonzero(above_mask)
 
-    # Merge: threshold-based first, then KeyBERT additions
-    seen, merged = set(), []
-    for phrase in above_threshold + keybert:
-        if phrase not in seen:
-            seen.add(phrase)
-            merged.append(phrase)
+    # Source 3: top_n by score (KeyBERT-style) — partition, then sort only those;
+    # a candidate list no longer than top_n is just sorted
+    if top_n <= 0:
+        keybert = np.empty(0, dtype=np.intp)
+    elif len(scores) > top_n:
+        keybert = np.argpartition(-scores, top_n - 1)[:top_n]
+        keybert = keybert[np.argsort(-scores[keybert])]
+    else:
+        keybert = np.argsort(-scores)
 
-    return merged
+    # Merge: threshold-based first, then KeyBERT additions, excluding an exact
+    # match with the query. A top-n pick is a duplicate exactly when it already
+    # cleared the threshold, so the mask replaces a dedup pass.
+    merged = np.concatenate([above_threshold, keybert[~above_mask[keybert]]])
+    return [candidates[i] for i in merged if candidates[i] != query]
 
 
 # ── Public API ────────────────────────────────────────────────────────────────
@@ -100,6 +158,7 @@ def expand(
     max_additions:      int               = 8,
     sim_threshold:      float             = 0.70,
     keybert_top_n:      int               = 4,
+    query_vec:          np.ndarray | None = None,   # forwarded to _embedding_expansion
 ) -> str:
 
     if not query or not query.strip():
@@ -124,6 +183,7 @@ def expand(
         query, bi_encoder,
         top_n=keybert_top_n,
         sim_threshold=sim_threshold,
+        query_vec=query_vec,
     )
     _add(embedding_terms)
 
@@ -6,11 +6,32 @@
 
 from __future__ import annotations
 
+import dbm
+import hashlib
 import json
 import logging
+import os
+import re
+import shelve
+import threading
+from functools import lru_cache
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: typed, C-level validation of the answer against the output schema
+try:
+    import msgspec
+    HAS_MSGSPEC = True
+except ImportError:
+    HAS_MSGSPEC = False
 
 # فرض می‌کنیم این مقادیر در config.py تعریف شده‌اند
 from .config import (
+    DB_PATH,
     TEXT2SQL_API_KEY,      # ← کلید جدید برای Groq
     TEXT2SQL_MODEL,        # مثلاً "qwen/qwen3-32b" یا "llama-3.1-70b-versatile" و ...
 )
@@ -49,6 +70,10 @@ _SYSTEM_PROMPT = """شما یک موتور استخراج اطلاعات ساخ
 }"""
 
 
+# Markdown fence around the JSON answer (```json ... ```); an unclosed fence runs to the end
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|\Z)", re.DOTALL)
+
+
 # ── LLM client (lazy import) ──────────────────────────────────────────────────
 
 def _get_client():
@@ -84,21 +109,109 @@ def _call_llm(query: str) -> dict:
     raw = resp.choices[0].message.content.strip()
 
     # حذف فنس‌های مارک‌داون احتمالی (```json ... ```)
-    if raw.startswith("```"):
-        parts = raw.split("```", 2)
-        if len(parts) > 2:
-            raw = parts[1].lstrip("json \n").rstrip("\n ")
-        else:
-            raw = parts[-1].strip()
+    fence = _JSON_FENCE_RE.search(raw)
+    if fence:
+        raw = fence.group(1)
+
+    return _decode_answer(raw)
+
+
+# ── Response cache ────────────────────────────────────────────────────────────
+# Parsed answers are kept in memory (LRU) and on disk (shelve next to the DB),
+# so repeated queries — e.g. every evaluation run — skip the API call even
+# across restarts. Temperature is 0, so an answer only goes stale when the
+# model or the prompt changes; both are hashed into every key.
+
+_CACHE_PATH    = os.path.splitext(DB_PATH)[0] + "_llm_cache"
+_CACHE_VERSION = hashlib.sha1(f"{TEXT2SQL_MODEL}\n{_SYSTEM_PROMPT}".encode()).hexdigest()[:12]
+
+_shelf        = None
+_shelf_failed = False
+_shelf_lock   = threading.Lock()   # shelve is not thread-safe
+
+
+def _open_shelf():
+    """Open the on-disk cache once; returns None if it cannot be opened."""
+    global _shelf, _shelf_failed
+    if _shelf is None and not _shelf_failed:
+        try:
+            _shelf = shelve.open(_CACHE_PATH)
+        except (OSError, *dbm.error) as exc:
+            log.warning("LLM disk cache unavailable (%s) — using memory only.", exc)
+            _shelf_failed = True
+    return _shelf
+
+
+def _call_llm_cached(query: str) -> dict:
+    """
+    _call_llm() behind the disk cache (the memory cache is _extract_cached()).
+    Failures raise and are therefore never cached.
+    """
+    key = f"{_CACHE_VERSION}:{query}"
+    with _shelf_lock:
+        shelf = _open_shelf()
+        if shelf is not None and key in shelf:
+            return shelf[key]
+
+    llm_data = _call_llm(query)
+
+    with _shelf_lock:
+        shelf = _open_shelf()
+        if shelf is not None:
+            try:
+                shelf[key] = llm_data
+                shelf.sync()
+            except (OSError, *dbm.error) as exc:
+                log.warning("Could not write LLM disk cache: %s", exc)
+    return llm_data
+
+
+# ── Schema conversion ─────────────────────────────────────────────────────────
+
+if HAS_MSGSPEC:
+    class _LLMSchema(msgspec.Struct, kw_only=True):
+        """The output schema from _SYSTEM_PROMPT, with the shapes models actually return."""
+        doc_type:          list[str] | str | None = None
+        degree:            list[str] | str | None = None
+        year_exact:        list[int] | int | None = None
+        year_from:         int | None             = None
+        year_to:           int | None             = None
+        university:        list[str] | str | None = None
+        authors:           list[str] | str | None = None
+        advisors:          list[str] | str | None = None
+        co_advisors:       list[str] | str | None = None
+        keywords:          str | None             = None
+        expanded_keywords: list[str] | str | None = None
+
+    # strict=False coerces numeric strings ("1399") the way int() did below
+    _schema_decoder = msgspec.json.Decoder(_LLMSchema, strict=False)
+
+
+def _decode_answer(raw: str) -> dict:
+    """
+    Parse the model's JSON answer. With msgspec installed, the schema is
+    validated and coerced in one C pass; answers that do not fit it (extra
+    nesting, non-numeric years, ...) fall back to a plain parse and the
+    lenient conversion in _to_filter_dict().
+    """
+    if HAS_MSGSPEC:
+        try:
+            return msgspec.structs.asdict(_schema_decoder.decode(raw))
+        except msgspec.ValidationError:
+            pass
+        except msgspec.DecodeError as e:
+            log.warning("JSON parse error from Groq response: %s\nRaw: %s", e, raw)
+            raise
 
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError as e:
+        return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+    except json.JSONDecodeError as e:   # orjson.JSONDecodeError subclasses it
         log.warning("JSON parse error from Groq response: %s\nRaw: %s", e, raw)
         raise
 
 
-# ── Schema conversion ─────────────────────────────────────────────────────────
+# Separators between several names in one string field ("الف، ب و ج")
+_NAME_SPLIT_RE = re.compile(r"[،,؛;]\s*|\s+و\s+")
 
 # این بخش بدون تغییر باقی می‌ماند (یا تغییرات جزئی اگر لازم باشد)
 # فقط برای کامل بودن دوباره می‌گذارم
@@ -136,15 +249,12 @@ def _to_filter_dict(llm_data: dict) -> dict:
                 f[field] = cleaned if len(cleaned) > 1 else cleaned[0]
 
     # نام‌ها (اساتید، نویسندگان و ...)
-    import re
-    split_pattern = r"[،,؛;]\s*|\s+و\s+"
-
     for field in ("advisors", "co_advisors", "authors"):
         value = llm_data.get(field)
         if not value:
             continue
         if isinstance(value, str):
-            names = [n.strip() for n in re.split(split_pattern, value) if n.strip()]
+            names = [n.strip() for n in _NAME_SPLIT_RE.split(value) if n.strip()]
         else:
             names = [str(i).strip() for i in (value if isinstance(value, (list,tuple)) else [value])]
         if names:
@@ -180,7 +290,7 @@ def extract(query: str) -> LLMParseResult:
         return _UNAVAILABLE
 
     try:
-        llm_data = _call_llm(query)
+        return _extract_cached(" ".join(query.split()))
     except ImportError:
         log.warning("groq package not installed — LLM parser unavailable.")
         return _UNAVAILABLE
@@ -188,6 +298,16 @@ def extract(query: str) -> LLMParseResult:
         log.warning("Groq LLM call failed: %s", exc, exc_info=True)
         return _UNAVAILABLE
 
+
+@lru_cache(maxsize=1024)
+def _extract_cached(query: str) -> LLMParseResult:
+    """
+    Answer plus schema conversion, memoised per normalised query so a repeated
+    query skips both. Failures raise and are never cached. Treat the result
+    (and its filters dict) as read-only.
+    """
+    llm_data = _call_llm_cached(query)
+
     filters = _to_filter_dict(llm_data)
 
     raw_kw = (llm_data.get("keywords") or "").strip()
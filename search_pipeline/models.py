@@ -4,80 +4,521 @@
 # A single instance is kept loaded; if the user switches models, the engine
 # hot-swaps it on the next request (lazy load + cache).
 
+import gc
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+
 import numpy as np
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer, CrossEncoder
 from .config import BI_ENCODER_MODEL, CROSS_ENCODER_REGISTRY, DEFAULT_CROSS_ENCODER
 
 
+# Cross-encoder predict() batch size. Pairs are scored in a few large batches
+# (torch already spreads each batch over all CPU cores); GPUs take bigger ones.
+CE_BATCH_SIZE_CPU = 32
+CE_BATCH_SIZE_GPU = 64
+
+# Cross-encoders kept loaded (the active one plus recently used ones parked in
+# host RAM), so switching back is a host-to-device copy instead of a disk load.
+CE_RESIDENT_MODELS = 2
+
+# Memoised rerank score tuples, keyed on (cross-encoder key, pairs)
+RERANK_CACHE_SIZE = 256
+
+
+# ── Reduced precision ─────────────────────────────────────────────────────────
+# On GPUs with native bfloat16 (Ampere and newer) both encoders run in BF16,
+# halving weight traffic per forward pass. Reductions stay in FP32: token
+# embeddings are upcast before pooling / normalisation, and cross-encoder
+# logits before scoring. CPUs keep FP32, where BF16 is usually slower.
+
+USE_BF16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+
+
+def _upcast_token_embeddings(module, inputs, features: dict) -> dict:
+    features["token_embeddings"] = features["token_embeddings"].float()
+    return features
+
+
+def _upcast_logits(module, inputs, output):
+    output.logits = output.logits.float()
+    return output
+
+
+# ── ONNX Runtime ──────────────────────────────────────────────────────────────
+# Optional (pip install "sentence-transformers[onnx]"): encoders are exported
+# to ONNX on first load and run through ONNX Runtime. On CPU the export is
+# also dynamically quantised to INT8 and cached under ONNX_CACHE_DIR, so the
+# quantisation runs once per model. GPUs run the FP32 export on the CUDA
+# execution provider (static INT8 needs a calibration set this repo lacks).
+#
+# Opt-in (Models(use_onnx=True)): the shipped FAISS index holds FP32 PyTorch
+# passage embeddings, and INT8 query vectors against them lose recall. Enable
+# it only after re-encoding the corpus with that model's encode_passages() and
+# rebuilding the FAISS index (and any passage cache) from those vectors.
+
+try:
+    import onnxruntime  # noqa: F401 — backend="onnx" needs it at load time
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    HAS_ONNX = True
+except ImportError:
+    HAS_ONNX = False
+
+ONNX_CACHE_DIR   = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "onnx_models")
+ONNX_QUANT_TYPE  = "avx2"      # most portable x86 INT8 kernel set
+_ONNX_QUANT_FILE = f"onnx/model_qint8_{ONNX_QUANT_TYPE}.onnx"
+
+
+def _load_onnx(model_cls, model_name: str):
+    """Load *model_name* with the ONNX backend (INT8-quantised on CPU)."""
+    if torch.cuda.is_available():
+        return model_cls(model_name, backend="onnx",
+                         model_kwargs={"provider": "CUDAExecutionProvider"})
+
+    local = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(local, _ONNX_QUANT_FILE)):
+        model = model_cls(model_name, backend="onnx")   # exports to ONNX
+        model.save_pretrained(local)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANT_TYPE, local)
+    return model_cls(local, backend="onnx", model_kwargs={"file_name": _ONNX_QUANT_FILE})
+
+
+# ── Encoder loading ───────────────────────────────────────────────────────────
+
+def _load_bi_encoder(model_name: str, use_onnx: bool = False) -> SentenceTransformer:
+    if use_onnx:
+        return _load_onnx(SentenceTransformer, model_name)
+    if not USE_BF16:
+        return SentenceTransformer(model_name)
+    model = SentenceTransformer(model_name, model_kwargs={"torch_dtype": torch.bfloat16})
+    model[0].register_forward_hook(_upcast_token_embeddings)   # Transformer -> Pooling
+    return model
+
+
+def _load_cross_encoder(model_name: str, use_onnx: bool = False) -> CrossEncoder:
+    if use_onnx:
+        try:
+            return _load_onnx(CrossEncoder, model_name)
+        except TypeError:
+            # CrossEncoder gained backend= in sentence-transformers 4.1
+            print("⚠️  This sentence-transformers has no ONNX CrossEncoder — using PyTorch")
+    if not USE_BF16:
+        return CrossEncoder(model_name)
+    model = CrossEncoder(model_name, automodel_args={"torch_dtype": torch.bfloat16})
+    model.model.register_forward_hook(_upcast_logits)
+    return model
+
+
+# ── Compressed index ──────────────────────────────────────────────────────────
+# Flat indexes are converted once to a compressed form, cached next to the
+# original index file:
+#   • SQ8    — int8 scalar quantisation (4× smaller, exhaustive scan)
+#   • IVF-PQ — for large corpora, so full-corpus search is sublinear; the PQ
+#              shortlist (k_factor × k) is re-scored against BF16 copies of
+#              the vectors, which also serve reconstruct()
+# Vectors keep their positions, so doc_ids still maps FAISS position -> document ID.
+
+SQ8_MIN_VECTORS = 10_000      # below this, exact FP32 flat search is fast enough
+IVF_MIN_VECTORS = 100_000
+IVF_PQ_M        = 32          # PQ sub-quantizers (must divide the dimension)
+IVF_NPROBE_DIV  = 50          # nprobe = nlist / IVF_NPROBE_DIV
+IVF_REFINE_K    = 10          # PQ candidates re-scored per requested result
+GPU_MAX_K       = 2048        # faiss GPU k-selection limit (per search call)
+
+
+def build_ivf_index(vecs: np.ndarray) -> faiss.Index:
+    """Train an IVF{nlist},PQ{m}x8 inner-product index with a BF16 refine stage over *vecs* (in order)."""
+    n, d  = vecs.shape
+    nlist = min(4096, max(1, int(4 * math.sqrt(n))))
+    codec = f"PQ{IVF_PQ_M}x8,Refine(SQbf16)" if d % IVF_PQ_M == 0 else "Flat"
+    index = faiss.index_factory(d, f"IVF{nlist},{codec}", faiss.METRIC_INNER_PRODUCT)
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = IVF_REFINE_K
+
+    # ~100k training vectors is plenty for both the coarse and PQ codebooks
+    rng    = np.random.default_rng(0)
+    sample = vecs[rng.choice(n, size=min(n, 100_000), replace=False)]
+    index.train(sample)
+    index.add(vecs)
+    return index
+
+
+def build_sq8_index(vecs: np.ndarray) -> faiss.Index:
+    """Scalar-quantise *vecs* to int8 in an exhaustive inner-product index (in order)."""
+    index = faiss.index_factory(vecs.shape[1], "SQ8", faiss.METRIC_INNER_PRODUCT)
+    index.train(vecs)
+    index.add(vecs)
+    return index
+
+
+def _compress_flat_index(index: faiss.Index, index_path: str) -> faiss.Index:
+    """Return the SQ8 / IVF-PQ counterpart of a large flat index (cached on disk)."""
+    if not isinstance(index, faiss.IndexFlat) or index.ntotal < SQ8_MIN_VECTORS:
+        return index
+
+    if index.ntotal >= IVF_MIN_VECTORS:
+        suffix, build, label = ".ivfpq_bf16", build_ivf_index, "IVF-PQ (+BF16 refine)"
+    else:
+        suffix, build, label = ".sq8", build_sq8_index, "SQ8"
+
+    cached = index_path + suffix
+    if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(index_path):
+        return faiss.read_index(cached)
+
+    print(f"Building {label} index over {index.ntotal} vectors...")
+    compressed = build(index.reconstruct_n(0, index.ntotal))
+    faiss.write_index(compressed, cached)
+    return compressed
+
+
+def _faiss_build_info() -> str:
+    """Describe the loaded FAISS build (version + SIMD / oneDNN compile options)."""
+    try:
+        opts = faiss.get_compile_options()
+    except AttributeError:   # very old builds
+        opts = "unknown"
+    return f"faiss {getattr(faiss, '__version__', '?')} [{opts}]"
+
+
+# ── Passage-vector cache ──────────────────────────────────────────────────────
+# Passage embeddings can be kept next to the index as bfloat16 — stored as the
+# upper 16 bits of each float32 in a uint16 .npy, so no extra dtype package is
+# needed and the file memory-maps directly. Rows follow FAISS positions and
+# give the filtered path exact-to-BF16 vectors whatever the index compression.
+
+def _to_bf16_bits(vecs: np.ndarray) -> np.ndarray:
+    """float32 -> bfloat16 bit patterns (uint16), rounding to nearest even."""
+    bits = np.ascontiguousarray(vecs, dtype=np.float32).view(np.uint32)
+    bits = bits + (0x7FFF + ((bits >> 16) & 1))
+    return (bits >> 16).astype(np.uint16)
+
+
+def _from_bf16_bits(bits: np.ndarray) -> np.ndarray:
+    """bfloat16 bit patterns (uint16) -> float32."""
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+def _index_to_gpu(res, index: faiss.Index) -> faiss.Index:
+    """Copy *index* to GPU 0; an IndexRefine keeps its BF16 refine stage on the CPU."""
+    if isinstance(index, faiss.IndexRefine):
+        gpu_index = faiss.IndexRefine(faiss.index_cpu_to_gpu(res, 0, index.base_index),
+                                      index.refine_index)
+        gpu_index.k_factor = index.k_factor
+        return gpu_index
+    return faiss.index_cpu_to_gpu(res, 0, index)
+
+
+def _tune_ivf(index: faiss.Index) -> None:
+    """Set nprobe and enable reconstruct() on an IVF index; no-op otherwise."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = max(2, ivf.nlist // IVF_NPROBE_DIV)
+    ivf.make_direct_map()
+
+
+# ── Request coalescing ────────────────────────────────────────────────────────
+# Flask serves searches from a thread pool; without coordination every thread
+# runs its own batch-of-one forward pass. A single worker thread drains all
+# pending encode requests into one batched call, so requests that arrive
+# while the encoder is busy share the next pass (no fixed wait window: an
+# idle server encodes immediately).
+
+class EncodeBatcher:
+    """Coalesce concurrent encode(texts) calls into one call of *encode_fn*."""
+
+    def __init__(self, encode_fn):
+        self._encode_fn = encode_fn
+        self._pending: list[tuple[list[str], Future]] = []
+        self._cv = threading.Condition()
+        threading.Thread(target=self._run, name="encode-batcher", daemon=True).start()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        future = Future()
+        with self._cv:
+            self._pending.append((texts, future))
+            self._cv.notify()
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._pending:
+                    self._cv.wait()
+                batch, self._pending = self._pending, []
+
+            try:
+                vecs = self._encode_fn([t for texts, _ in batch for t in texts])
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            start = 0
+            for texts, future in batch:
+                future.set_result(vecs[start:start + len(texts)])
+                start += len(texts)
+
+
+def _move_cross_encoder(model: CrossEncoder, device: str) -> bool:
+    """Move a PyTorch cross-encoder's weights to *device*; False for ONNX models, which stay put."""
+    if not isinstance(model.model, torch.nn.Module):
+        return False
+    model.model.to(device)
+    return True
+
+
+def _release_gpu_memory() -> None:
+    """Return freed blocks from PyTorch's caching allocator to the driver."""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _pair_text(doc: dict) -> str:
+    """Cross-encoder passage for *doc*: title + abstract + keywords, built in one pass."""
+    return f"{doc['title']} {doc.get('abs_text', '')} {doc.get('keyword_text', '')}"
+
+
 class Models:
     """
     Container for all ML models and the FAISS index.
 
     Attributes:
         bi_encoder       — SentenceTransformer for dense retrieval
-        cross_encoder    — currently active CrossEncoder for reranking
-        _ce_key          — registry key of the currently loaded cross-encoder
-        index            — FAISS flat inner-product index
+        cross_encoder    — currently active CrossEncoder for reranking (read-only)
+        _ce_key          — registry key of the currently loaded cross-encoder (read-only)
+        index            — FAISS inner-product index (flat, SQ8 or IVF-PQ + BF16 refine by corpus size)
+        gpu_index        — GPU copy of index used by dense_search(), or None without CUDA
         doc_ids          — numpy array: FAISS position i -> document ID
+        id_to_pos        — dict: document ID -> FAISS position (inverse of doc_ids)
+        passage_vecs     — memory-mapped BF16 passage vectors by FAISS position, or None
     """
 
-    def __init__(self):
+    def __init__(self, use_onnx: bool = False):
+        # PyTorch by default, matching the encoder the FAISS index was built with;
+        # use_onnx=True needs an index re-encoded with ONNX too (see above)
+        self._use_onnx = use_onnx and HAS_ONNX
+        if use_onnx and not HAS_ONNX:
+            print("⚠️  onnxruntime/optimum not installed — running encoders in PyTorch "
+                  "(pip install \"sentence-transformers[onnx]\")")
+
         print(f"Loading bi-encoder ({BI_ENCODER_MODEL})...")
-        self.bi_encoder = SentenceTransformer(BI_ENCODER_MODEL)
+        self.bi_encoder = _load_bi_encoder(BI_ENCODER_MODEL, self._use_onnx)
 
-        # Load the default cross-encoder at startup
-        self._ce_key      = DEFAULT_CROSS_ENCODER
-        ce_model_name     = CROSS_ENCODER_REGISTRY[DEFAULT_CROSS_ENCODER]["model"]
+        # Load the default cross-encoder at startup. The active (key, model)
+        # pair is one tuple, replaced in a single assignment on a swap
+        ce_model_name = CROSS_ENCODER_REGISTRY[DEFAULT_CROSS_ENCODER]["model"]
         print(f"Loading cross-encoder ({ce_model_name})...")
-        self.cross_encoder = CrossEncoder(ce_model_name)
+        self._ce_active: tuple[str, CrossEncoder] = (
+            DEFAULT_CROSS_ENCODER, _load_cross_encoder(ce_model_name, self._use_onnx),
+        )
 
         print("✅ Models ready.\n")
-        self.index   = None
-        self.doc_ids = None
+        self.index        = None
+        self.gpu_index    = None
+        self._gpu_res     = None
+        self.doc_ids      = None
+        self.id_to_pos    = {}
+        self.passage_vecs = None
+
+        # Serialises cross-encoder hot-swaps when requests run on several threads
+        self._ce_lock = threading.Lock()
+        self._ce_parked: OrderedDict[str, CrossEncoder] = OrderedDict()   # key → CE in host RAM
+
+        # Reranks in flight per cross-encoder key; a swap waits until the
+        # outgoing model has none before moving it off the GPU
+        self._ce_users: Counter[str] = Counter()
+        self._ce_idle = threading.Condition()
+
+        self._ce_batch_size = CE_BATCH_SIZE_GPU if torch.cuda.is_available() else CE_BATCH_SIZE_CPU
+
+        # Query embeddings from all request threads share batched forward passes
+        self._query_batcher = EncodeBatcher(self._encode_queries_now)
+
+        # Memoised model calls. The bi-encoder never changes, so query vectors
+        # are keyed on text alone; rerank scores are keyed on the CE key too
+        # (an LRU of plain score tuples, so swapped-out models are not kept alive)
+        self._encode_query_cached = lru_cache(maxsize=1024)(self._encode_query)
+        self._rerank_cache: OrderedDict[tuple, tuple] = OrderedDict()
+        self._rerank_lock = threading.Lock()
+
+    @contextmanager
+    def _using_cross_encoder(self):
+        """Snapshot the active (key, model) pair and keep it in place until the block exits."""
+        with self._ce_idle:
+            ce_key, ce = self._ce_active
+            self._ce_users[ce_key] += 1
+        try:
+            yield ce_key, ce
+        finally:
+            with self._ce_idle:
+                self._ce_users[ce_key] -= 1
+                if not self._ce_users[ce_key]:
+                    self._ce_idle.notify_all()
+
+    @property
+    def cross_encoder(self) -> CrossEncoder:
+        return self._ce_active[1]
+
+    @property
+    def _ce_key(self) -> str:
+        return self._ce_active[0]
+
+    def load_index(
+        self,
+        index_path:        str,
+        doc_ids_path:      str,
+        passage_vecs_path: str | None = None,
+    ) -> None:
+        """
+        Load the pre-built FAISS index and its document ID mapping from disk.
+        Large flat indexes are swapped for a cached SQ8 / IVF-PQ copy.
+        A BF16 passage-vector cache (default: <index>.passages_bf16.npy, see
+        save_passage_cache) is memory-mapped when present.
+        """
+        index = _compress_flat_index(faiss.read_index(index_path), index_path)
+        _tune_ivf(index)
+
+        self.index     = index
+        self.doc_ids   = np.load(doc_ids_path)
+        self.id_to_pos = {int(d): i for i, d in enumerate(self.doc_ids)}
+
+        passage_vecs_path = passage_vecs_path or index_path + ".passages_bf16.npy"
+        if os.path.exists(passage_vecs_path):
+            vecs = np.load(passage_vecs_path, mmap_mode="r")
+            if vecs.shape == (index.ntotal, index.d):
+                self.passage_vecs = vecs
+            else:
+                print(f"⚠️  Ignoring {passage_vecs_path}: shape {vecs.shape} does not match the index.")
+
+        # Full-corpus search runs on the GPU when one is available; the CPU index
+        # stays loaded for reconstruct_batch() in the filtered path
+        if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+            try:
+                self._gpu_res  = faiss.StandardGpuResources()
+                self.gpu_index = _index_to_gpu(self._gpu_res, self.index)
+                print("✅ FAISS index copied to GPU 0.")
+            except RuntimeError as exc:
+                print(f"⚠️  Could not move FAISS index to GPU ({exc}); using CPU.")
+                self._gpu_res, self.gpu_index = None, None
+
+        build_info = _faiss_build_info()
+        print(f"✅ FAISS index loaded: {self.index.ntotal} vectors ({build_info}).\n")
+        if "DNNL" not in build_info:
+            print("   ℹ️  FAISS build without oneDNN — inner products use the BLAS/SIMD kernels.")
 
-    def load_index(self, index_path: str, doc_ids_path: str) -> None:
-        """Load the pre-built FAISS index and its document ID mapping from disk."""
-        self.index   = faiss.read_index(index_path)
-        self.doc_ids = np.load(doc_ids_path)
-        print(f"✅ FAISS index loaded: {self.index.ntotal} vectors.\n")
+    def dense_search(self, q_vecs: np.ndarray, k: int) -> np.ndarray:
+        """Top-*k* FAISS positions for each row of *q_vecs* (GPU index if available)."""
+        if self.gpu_index is not None and k <= GPU_MAX_K:
+            params = None
+            if isinstance(self.gpu_index, faiss.IndexRefine) and k * self.gpu_index.k_factor > GPU_MAX_K:
+                # Shrink the PQ shortlist for this call so the GPU base search stays in range
+                params = faiss.IndexRefineSearchParameters(k_factor=GPU_MAX_K / k)
+            try:
+                _, indices = self.gpu_index.search(q_vecs, k, params=params)
+                return indices
+            except RuntimeError as exc:
+                print(f"⚠️  GPU FAISS search failed ({exc}); retrying on the CPU index.")
+
+        _, indices = self.index.search(q_vecs, k)
+        return indices
 
     def set_cross_encoder(self, key: str) -> None:
         """
         Hot-swap the cross-encoder to the one identified by *key*.
-        No-op if the requested model is already loaded.
+        No-op if the requested model is already loaded. The new model is
+        loaded (or moved back from host RAM) before it replaces the active
+        (key, model) pair in one assignment, so a concurrent rerank sees one
+        pair or the other, never a half-switched state. Reranks that started
+        on the outgoing model finish on it; only then is it parked in host
+        RAM (up to CE_RESIDENT_MODELS stay loaded) and its GPU memory released.
         """
         if key == self._ce_key:
             return
         if key not in CROSS_ENCODER_REGISTRY:
             raise ValueError(f"Unknown cross-encoder key: {key!r}. "
                              f"Valid keys: {list(CROSS_ENCODER_REGISTRY)}")
-        model_name = CROSS_ENCODER_REGISTRY[key]["model"]
-        print(f"🔄 Switching cross-encoder to {model_name}...")
-        self.cross_encoder = CrossEncoder(model_name)
-        self._ce_key       = key
-        print("✅ Cross-encoder switched.\n")
+        with self._ce_lock:
+            old_key, old = self._ce_active
+            if key == old_key:   # another thread already switched
+                return
+            model_name = CROSS_ENCODER_REGISTRY[key]["model"]
+            print(f"🔄 Switching cross-encoder to {model_name}...")
+            on_gpu = torch.cuda.is_available()
+
+            # Fully load and place the incoming model before anyone can see it
+            model = self._ce_parked.pop(key, None)
+            if model is None:
+                model = _load_cross_encoder(model_name, self._use_onnx)
+            elif on_gpu:
+                _move_cross_encoder(model, "cuda")
+            with self._ce_idle:
+                self._ce_active = (key, model)
+                self._ce_idle.wait_for(lambda: not self._ce_users[old_key])
+
+            # Park the outgoing model; an ONNX session on the GPU cannot move, so drop it
+            if not on_gpu or _move_cross_encoder(old, "cpu"):
+                self._ce_parked[old_key] = old
+            while len(self._ce_parked) > CE_RESIDENT_MODELS - 1:
+                self._ce_parked.popitem(last=False)
+            del old
+            _release_gpu_memory()
+            print("✅ Cross-encoder switched.\n")
 
     def encode_query(self, text: str) -> np.ndarray:
-        """Embed a query string and L2-normalise the resulting vector."""
-        vec = self.bi_encoder.encode(
-            ["query: " + text],
+        """Embed a query string and L2-normalise the resulting vector (memoised, read-only)."""
+        return self._encode_query_cached(text)
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        vec = self._query_batcher.encode([text])
+        vec.setflags(write=False)   # shared between callers via the cache
+        return vec
+
+    def encode_queries(self, texts: list[str]) -> np.ndarray:
+        """Embed several query strings in one batched forward pass (not memoised)."""
+        return self._query_batcher.encode(texts)
+
+    def _encode_queries_now(self, texts: list[str]) -> np.ndarray:
+        """Run the bi-encoder over *texts* (called from the batcher thread)."""
+        return self.bi_encoder.encode(
+            ["query: " + t for t in texts],
             convert_to_numpy=True,
+            normalize_embeddings=True,   # on the encoder's device, not a CPU pass
             show_progress_bar=False,
-        ).astype("float32")
-        faiss.normalize_L2(vec)
-        return vec
+            batch_size=32,
+        ).astype("float32", copy=False)
+
+    def vectors(self, positions: np.ndarray) -> np.ndarray:
+        """FP32 vectors for FAISS *positions*: BF16 passage cache if loaded, else the index."""
+        if self.passage_vecs is not None:
+            return _from_bf16_bits(self.passage_vecs[positions])
+        return self.index.reconstruct_batch(positions)
+
+    def save_passage_cache(self, path: str, texts: list[str]) -> None:
+        """
+        Encode *texts* (in FAISS position order, i.e. the doc_ids order) and
+        write them to *path* as BF16 for load_index(passage_vecs_path=...).
+        """
+        np.save(path, _to_bf16_bits(self.encode_passages(texts)))
 
     def encode_passages(self, texts: list[str]) -> np.ndarray:
         """Embed a list of passage strings and L2-normalise all vectors."""
-        vecs = self.bi_encoder.encode(
+        return self.bi_encoder.encode(
             ["passage: " + t for t in texts],
             convert_to_numpy=True,
+            normalize_embeddings=True,
             show_progress_bar=False,
             batch_size=16,
-        ).astype("float32")
-        faiss.normalize_L2(vecs)
-        return vecs
+        ).astype("float32", copy=False)
 
     def rerank(
         self,
@@ -91,9 +532,71 @@ class Models:
             query — the search query (SQL filter tokens stripped out)
             docs  — candidate documents
         """
-        pairs = [
-            (query, d["title"] + " " + d.get("abs_text", "") + " " + d.get("keyword_text", ""))
-            for d in docs
-        ]
-        scores = self.cross_encoder.predict(pairs, batch_size=4, show_progress_bar=False)
-        return sorted(zip(docs, scores.tolist()), key=lambda x: -x[1])
\ No newline at end of file
+        pairs = tuple((query, _pair_text(d)) for d in docs)
+        with self._using_cross_encoder() as (ce_key, ce):
+            scores = self._rerank_scores(ce_key, ce, pairs)
+        return sorted(zip(docs, scores), key=lambda x: -x[1])
+
+    def rerank_batch(
+        self,
+        items: list[tuple[str, list[dict]]],
+    ) -> list[list[tuple[dict, float]]]:
+        """
+        Rerank several (query, docs) groups with one cross-encoder call.
+        Returns one sorted result list per group, in input order.
+        """
+        pairs = [(query, _pair_text(d)) for query, docs in items for d in docs]
+        with self._using_cross_encoder() as (_, ce):
+            scores = self._predict(ce, pairs).tolist() if pairs else []
+
+        out, start = [], 0
+        for _, docs in items:
+            group = scores[start:start + len(docs)]
+            start += len(docs)
+            out.append(sorted(zip(docs, group), key=lambda x: -x[1]))
+        return out
+
+    def _rerank_scores(self, ce_key: str, ce: CrossEncoder, pairs: tuple) -> tuple:
+        """Scores of *ce* for *pairs*, memoised on (*ce_key*, *pairs*)."""
+        key = (ce_key, pairs)
+        with self._rerank_lock:
+            scores = self._rerank_cache.get(key)
+            if scores is not None:
+                self._rerank_cache.move_to_end(key)
+                return scores
+
+        scores = tuple(self._predict(ce, list(pairs)).tolist())
+        with self._rerank_lock:
+            self._rerank_cache[key] = scores
+            while len(self._rerank_cache) > RERANK_CACHE_SIZE:
+                self._rerank_cache.popitem(last=False)
+        return scores
+
+    def _predict(self, ce: CrossEncoder, pairs: list) -> np.ndarray:
+        """
+        Scores of cross-encoder *ce* for *pairs*, with autograd bookkeeping off.
+
+        Mirrors CrossEncoder.predict(), but tokenizes every pair in one
+        tokenizer call; each forward chunk only pads its slice of the ids.
+        """
+        if not pairs:
+            return np.empty(0, dtype="float32")
+
+        tokenizer  = ce.tokenizer
+        activation = getattr(ce, "activation_fn", None) or ce.default_activation_function
+        features   = tokenizer(
+            [q for q, _ in pairs], [t for _, t in pairs],
+            truncation=True, max_length=ce.max_length,
+        )
+
+        step, scores = self._ce_batch_size, []
+        with torch.inference_mode():
+            for start in range(0, len(pairs), step):
+                chunk = tokenizer.pad(
+                    {k: v[start:start + step] for k, v in features.items()},
+                    return_tensors="pt",
+                ).to(ce.model.device)
+                scores.append(activation(ce.model(**chunk).logits).float().cpu())
+
+        scores = torch.cat(scores)
+        return (scores[:, 0] if scores.shape[1] == 1 else scores).numpy()
\ No newline at end of file
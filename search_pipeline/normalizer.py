@@ -2,6 +2,8 @@
 # Converts Arabic-script variants to their standard Persian equivalents
 # and strips zero-width characters that cause silent mismatches.
 
+from functools import lru_cache
+
 try:
     from hazm import Normalizer
     _hazm = Normalizer()
@@ -9,6 +11,10 @@ try:
 except ImportError:
     HAS_HAZM = False
 
+# Queries, tokens and entity names are short and recur constantly, so their
+# results are memoised; long document texts bypass the cache.
+_CACHE_MAX_LEN = 256
+
 
 def normalize(text: str) -> str:
     """
@@ -20,12 +26,24 @@ def normalize(text: str) -> str:
     """
     if not text:
         return ""
+    if len(text) <= _CACHE_MAX_LEN:
+        return _normalize_cached(text)
+    return _normalize(text)
+
 
+def _normalize(text: str) -> str:
     if HAS_HAZM:
         return _hazm.normalize(text)
 
+    # Nothing to substitute in pure-ASCII text
+    if text.isascii():
+        return text.strip()
+
     # Replace Arabic letter variants with Persian equivalents
     text = text.replace("ك", "ک").replace("ي", "ی").replace("ة", "ه")
     # Remove zero-width non-joiners and right-to-left marks
     text = text.replace("\u200c", " ").replace("\u200f", "")
-    return text.strip()
\ No newline at end of file
+    return text.strip()
+
+
+_normalize_cached = lru_cache(maxsize=100_000)(_normalize)
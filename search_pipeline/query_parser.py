@@ -10,6 +10,10 @@
 #     - extra words between the trigger and the name
 
 import re
+from functools import lru_cache
+
+import numpy as np
+
 from .config import UNIVERSITY_TRIGGERS
 
 # ---------------------------------------------------------------------------
@@ -17,22 +21,50 @@ from .config import UNIVERSITY_TRIGGERS
 # ---------------------------------------------------------------------------
 _university_list: list[str] = []   # filled in by engine at startup
 
+# Inverted bigram index over _university_list: bigram → rows (names) that
+# contain it. A query only touches the names it shares a bigram with — the
+# only ones that can clear the Jaccard threshold — instead of every name.
+_bigram_rows: dict[str, np.ndarray] = {}
+_uni_sizes = np.zeros(0, dtype=np.int64)   # bigrams per name
+
 
 def init_university_list(names: list[str]) -> None:
     """Feed the full university name list from the DB into the parser."""
-    global _university_list
+    global _university_list, _bigram_rows, _uni_sizes
     _university_list = [n.strip() for n in names if n.strip()]
 
+    # Each name's bigram set is built once, here; queries only build their own
+    grams = [_bigrams(n) for n in _university_list]
+
+    postings: dict[str, list[int]] = {}
+    for row, gs in enumerate(grams):
+        for g in gs:
+            postings.setdefault(g, []).append(row)
+    _bigram_rows = {g: np.array(rows, dtype=np.intp) for g, rows in postings.items()}
+    _uni_sizes   = np.fromiter(map(len, grams), dtype=np.int64, count=len(grams))
+
+    _parse_filters_cached.cache_clear()   # university matches depend on the list
+
 
 # ---------------------------------------------------------------------------
 # Person-name extraction patterns
 # ---------------------------------------------------------------------------
-_PERSON_PATTERNS = [
+# Words that may follow a name; every pattern shares this base set and adds
+# its own extras.  Kept as a lookahead (not a post-check on m.end()) so the
+# name group can still backtrack to a shorter match that ends before one.
+_PERSON_STOPWORDS = ("و", "یا", "که", "با", "در", "از")
+
+
+def _person_tail(*extra: str) -> str:
+    return r"(?=\s*(?:" + "|".join(_PERSON_STOPWORDS + extra) + r"|$))"
+
+
+_RAW_PERSON_PATTERNS = [
     # "استاد راهنما دکتر X" or "راهنما X"
     (
         r"(?:استاد\s+راهنما|راهنمای?)\s*:?\s*(?:دکتر|استاد|مهندس|پروفسور)?\s*"
         r"([آ-ی][آ-ی\s]{1,25}[آ-ی])"
-        r"(?=\s*(?:و|یا|که|با|در|از|برای|پایان|ارشد|دکتری|$))",
+        + _person_tail("برای", "پایان", "ارشد", "دکتری"),
         "advisors",
     ),
     # bare "دکتر X" (no explicit راهنما/مشاور trigger)
@@ -40,25 +72,32 @@ _PERSON_PATTERNS = [
         r"(?<!راهنما\s)(?<!مشاور\s)"
         r"(?:دکتر|مهندس|پروفسور)\s+"
         r"([آ-ی][آ-ی\s]{1,25}[آ-ی])"
-        r"(?=\s*(?:و|یا|که|با|در|از|راهنما|مشاور|$))",
+        + _person_tail("راهنما", "مشاور"),
         "advisors",
     ),
     # "استاد مشاور X" or "مشاور X"
     (
         r"(?:استاد\s+مشاور|مشاور)\s*:?\s*(?:دکتر|استاد|مهندس|پروفسور)?\s*"
         r"([آ-ی][آ-ی\s]{1,25}[آ-ی])"
-        r"(?=\s*(?:و|یا|که|با|در|از|$))",
+        + _person_tail(),
         "co_advisors",
     ),
     # "نوشته X", "اثر X", "توسط X", etc.
     (
         r"(?:نوشته|پدیدآور|نویسنده|توسط|اثر)\s*:?\s*"
         r"([آ-ی][آ-ی\s]{1,25}[آ-ی])"
-        r"(?=\s*(?:و|یا|که|با|در|از|$))",
+        + _person_tail(),
         "authors",
     ),
 ]
 
+# Compiled once at import; _extract_persons runs on every parse_filters call
+_PERSON_PATTERNS = [(re.compile(p), field) for p, field in _RAW_PERSON_PATTERNS]
+
+# Every person pattern needs one of these trigger words, so a single scan for
+# them rules out all four pattern searches on the (common) queries without one
+_PERSON_TRIGGER_RE = re.compile(r"راهنما|مشاور|دکتر|مهندس|پروفسور|نوشته|پدیدآور|نویسنده|توسط|اثر")
+
 _TRIM_TAIL = re.compile(r"\s+(?:راهنما|مشاور|استاد|دانشگاه|سال|ارشد|دکتری|پروپوزال|پایان).*$")
 _STOP_TAIL = re.compile(r"\s+(?:و|یا|که|با|در|از|برای|را|است|دانشگاه)$")
 _BLACKLIST  = re.compile(r"(?:راهنما|مشاور|استاد|دانشگاه|دکتری|پروپوزال|پایان)")
@@ -68,22 +107,58 @@ _BLACKLIST  = re.compile(r"(?:راهنما|مشاور|استاد|دانشگاه|
 # University fuzzy matching
 # ---------------------------------------------------------------------------
 
+def _bigrams(s: str) -> set:
+    s = s.replace(" ", "")
+    return {s[i:i+2] for i in range(len(s) - 1)} if len(s) >= 2 else {s}
+
+
 def _char_overlap_score(a: str, b: str) -> float:
     """
     Simple character-bigram Jaccard similarity between two strings.
     Fast and works well for Persian names that differ by a word or two.
     """
-    def bigrams(s: str) -> set:
-        s = s.replace(" ", "")
-        return {s[i:i+2] for i in range(len(s) - 1)} if len(s) >= 2 else {s}
-
-    bg_a = bigrams(a)
-    bg_b = bigrams(b)
+    bg_a = _bigrams(a)
+    bg_b = _bigrams(b)
     if not bg_a or not bg_b:
         return 0.0
     return len(bg_a & bg_b) / len(bg_a | bg_b)
 
 
+def _overlap_candidates(window: str, min_score: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (rows, scores): _char_overlap_score(window, name) for every name scoring at
+    least *min_score* (> 0), rows in list order.
+    """
+    q_grams  = _bigrams(window)
+    postings = [_bigram_rows[g] for g in q_grams if g in _bigram_rows]
+    if not postings:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    # A row's number of postings hits is its bigram intersection with the window.
+    # Dense lookups count with bincount (O(names)); sparse ones — few hits in a
+    # long list — sort the hits and run-length them (O(hits log hits)).
+    hits = np.concatenate(postings)
+    if len(hits) * 8 >= len(_uni_sizes):
+        counts = np.bincount(hits, minlength=len(_uni_sizes))
+        rows   = np.flatnonzero(counts)
+        inter  = counts[rows]
+    else:
+        hits.sort()
+        starts = np.flatnonzero(np.r_[True, hits[1:] != hits[:-1]])
+        rows   = hits[starts]
+        inter  = np.diff(np.r_[starts, len(hits)])
+
+    # Jaccard i / (a + q - i) >= t needs i >= t·q (as a >= i), so rows with
+    # too few shared bigrams are dropped on the counts alone, before scoring
+    # (the epsilon keeps rows sitting exactly on the bound)
+    keep  = inter >= min_score * len(q_grams) - 1e-9
+    rows, inter = rows[keep], inter[keep]
+    scores = inter / (_uni_sizes[rows] + len(q_grams) - inter)
+
+    keep = scores >= min_score
+    return rows[keep], scores[keep]
+
+
 def _find_university_in_query(query: str) -> str | None:
     """
     Detect a university mention and return the best-matching DB name.
@@ -106,42 +181,46 @@ def _find_university_in_query(query: str) -> str | None:
         if idx == -1:
             continue
 
-        # Grab up to 10 words after the trigger as the candidate window
-        after      = query[idx + len(trigger):].strip()
-        words      = after.split()[:10]
-        window     = " ".join(words)
+        # Grab up to 10 words after the trigger as the candidate window.
+        # maxsplit leaves the rest of the query unsplit, and the words are
+        # joined without spaces — _bigrams() drops spaces anyway.
+        window = "".join(query[idx + len(trigger):].split(maxsplit=10)[:10])
 
         if not window:
             continue
 
 
-        scores = []
-        for uni_name in _university_list:
-            score = _char_overlap_score(window, uni_name)
-            if score >= 0.15:   # threshold
-                scores.append((uni_name, score))
-
-        # sort descending by score
-        scores.sort(key=lambda x: x[1], reverse=True)
+        rows, scores = _overlap_candidates(window, min_score=0.15)   # threshold
 
-        # take top 3 (or 4)
+        # sort descending by score (stable: ties keep DB order), take top 3
         top_k = 3
-        best_matches = scores[:top_k]
-        best_names = [name for name, _ in best_matches]
-        return best_names
+        hits  = rows[np.argsort(-scores, kind="stable")][:top_k]
+        return [_university_list[i] for i in hits]
 
     return None
 
 
-def _university_regex_fallback(query: str) -> str | None:
-    """Regex-based extraction used only when the DB list is unavailable."""
-    for trigger in UNIVERSITY_TRIGGERS:
-        pattern = (
+# One compiled pattern per trigger, in trigger-priority order
+_UNIVERSITY_FALLBACK_PATTERNS = [
+    (
+        trigger,
+        re.compile(
             rf"{trigger}\s+"
             r"([آ-ی\w][آ-ی\w\s]{1,60}?)"
             r"(?=\s*(?:سال|مقطع|ارشد|دکتری|کارشناسی|پروپوزال|پایان|با|که|و|یا|\d|$))"
-        )
-        m = re.search(pattern, query)
+        ),
+    )
+    for trigger in UNIVERSITY_TRIGGERS
+]
+
+
+def _university_regex_fallback(query: str) -> str | None:
+    """Regex-based extraction used only when the DB list is unavailable."""
+    for trigger, pattern in _UNIVERSITY_FALLBACK_PATTERNS:
+        # A plain substring test is far cheaper than a failing regex search
+        if trigger not in query:
+            continue
+        m = pattern.search(query)
         if m:
             return m.group(1).strip()
     return None
@@ -181,20 +260,27 @@ _SQL_STRIP_PATTERNS = [
     r"مشاور",
     r"نوشته|پدیدآور|نویسنده|توسط|اثر",
     r"دکتر|مهندس|پروفسور",
-    # Connective filler words that become meaningless once filters are stripped
-    r"\bبین\b",
-    r"\bتا\b",
-    r"\bدر\b",
-    r"\bبا\b",
-    r"\bاز\b",
-    r"\bبرای\b",
-    r"\bسال\b",
 ]
 
-_SQL_STRIP_RE = re.compile("|".join(f"(?:{p})" for p in _SQL_STRIP_PATTERNS))
-
-
-import re
+# Connective filler words that become meaningless once filters are stripped.
+# Dropped as whole whitespace-separated tokens after the regex pass — a set
+# lookup per token instead of seven more \b...\b alternatives tried at every
+# position, and "سال‌های" / "با‌..." are no longer cut at the ZWNJ.
+_SQL_STOPWORDS = frozenset({"بین", "تا", "در", "با", "از", "برای", "سال"})
+
+# First character of every pattern above (keep in sync when adding one).
+# sre tries each of the ~30 alternatives at every position; the leading
+# lookahead rejects the many positions no pattern can start at in one
+# character-class test, without changing which alternative wins.
+_SQL_STRIP_LEAD = (
+    r"[\dابتدرسمنپک"
+    + "".join(sorted({re.escape(t[0]) for t in UNIVERSITY_TRIGGERS}))
+    + "]"
+)
+
+_SQL_STRIP_RE = re.compile(
+    f"(?={_SQL_STRIP_LEAD})(?:" + "|".join(f"(?:{p})" for p in _SQL_STRIP_PATTERNS) + ")"
+)
 
 def strip_filter_tokens(query: str, filters: dict) -> str:
     """
@@ -211,33 +297,44 @@ def strip_filter_tokens(query: str, filters: dict) -> str:
 
     cleaned = _SQL_STRIP_RE.sub(" ", query)
 
+    # Every token of every filter value (single values and lists alike).
+    # They are removed as exact whitespace-delimited tokens (safer boundary
+    # for Persian text), which is a set lookup — no per-query regex to compile.
+    drop = set(_SQL_STOPWORDS)
     for value in filters.values():
         if not value:
             continue
+        for v in (value if isinstance(value, list) else [value]):
+            drop.update(str(v).split())
 
-        # Support both single values and lists of values
-        if isinstance(value, list):
-            values = value
-        else:
-            values = [value]
-
-        for v in values:
-            # Split filter value into individual tokens
-            for token in str(v).split():
-                # Remove exact token match (safer boundary for Persian text)
-                cleaned = re.sub(
-                    rf'(?<!\S){re.escape(token)}(?!\S)',
-                    ' ',
-                    cleaned
-                )
-
-    # Collapse multiple spaces
-    cleaned = re.sub(r'\s{2,}', ' ', cleaned).strip()
+    # Drop filter tokens and filler words, collapsing whitespace, in one pass
+    cleaned = " ".join(t for t in cleaned.split() if t not in drop)
 
     # If stripping removed everything, fall back to original query
     return cleaned
 
 
+# ---------------------------------------------------------------------------
+# Filter-hint precheck
+# ---------------------------------------------------------------------------
+
+# Every token a filter can hang off (years, degree, doc type, university and
+# person triggers). A query matching none of them is plain free text.
+# "دانشکده" is listed too because the LLM prompt maps faculties to university.
+_FILTER_HINT_RE = re.compile(
+    r"[0-9۰-۹٠-٩]{4}"
+    r"|دکتر|ارشد|کارشناسی"
+    r"|پروپوزال|پیشنهاده|پیشنهادنامه|پایان‌?نامه|پارسا|رساله"
+    r"|راهنما|مشاور|استاد|مهندس|پروفسور|نوشته|پدیدآور|نویسنده|توسط|اثر"
+    r"|دانشکده|" + "|".join(re.escape(t) for t in UNIVERSITY_TRIGGERS)
+)
+
+
+def has_filter_hints(query: str) -> bool:
+    """True if the query mentions anything a metadata filter could be parsed from."""
+    return _FILTER_HINT_RE.search(query) is not None
+
+
 # ---------------------------------------------------------------------------
 # Main filter parser
 # ---------------------------------------------------------------------------
@@ -245,10 +342,12 @@ def strip_filter_tokens(query: str, filters: dict) -> str:
 def _extract_persons(query: str) -> dict:
     """Run person-name patterns against the query; return {field: name} pairs."""
     found = {}
+    if not _PERSON_TRIGGER_RE.search(query):
+        return found
     for pattern, field in _PERSON_PATTERNS:
         if field in found:
             continue
-        m = re.search(pattern, query)
+        m = pattern.search(query)
         if not m:
             continue
         name = m.group(1).strip()
@@ -260,6 +359,11 @@ def _extract_persons(query: str) -> dict:
     return found
 
 
+# Persian/Arabic-Indic digits → ASCII
+_DIGIT_MAP       = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_NON_ASCII_DIGIT = re.compile(r"[۰-۹٠-٩]")
+
+
 def parse_filters(query: str) -> dict:
     """
     Parse a Persian natural-language query and return a dict of metadata filters.
@@ -278,12 +382,24 @@ def parse_filters(query: str) -> dict:
         parse_filters("پروپوزال دکتری دانشگاه پیام نور کرج سال ۱۴۰۳")
         # -> {'doc_type': 'پیشنهاده', 'degree': 'دکتری',
         #     'university': 'دانشگاه پیام نور کرج', 'year_exact': 1403}
+
+    Results are memoised per query; each call returns its own (shallow) copy.
+    Queries with no filter hint at all (plain topic searches) return {}
+    straight away, without the parse or a cache slot.
     """
+    if not has_filter_hints(query):
+        return {}
+    return dict(_parse_filters_cached(query))
+
+
+@lru_cache(maxsize=1024)
+def _parse_filters_cached(query: str) -> dict:
+    """parse_filters() body; the returned dict is shared — never mutate it."""
     filters = {}
 
     # Convert Persian/Arabic-Indic digits to ASCII for reliable regex matching
-    digit_map = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
-    q = query.translate(digit_map)
+    # (translate() always copies, so only when there is something to convert)
+    q = query.translate(_DIGIT_MAP) if _NON_ASCII_DIGIT.search(query) else query
 
     # --- Year ---
     years = re.findall(r"\b(1[34]\d{2})\b", q)
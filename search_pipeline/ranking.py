@@ -1,29 +1,189 @@
 # Ranking utilities: BM25 scoring and Reciprocal Rank Fusion (RRF).
 
+import json
+import threading
+from collections import Counter, OrderedDict
+from itertools import chain
+
 import numpy as np
 
 try:
-    from rank_bm25 import BM25Okapi
-    HAS_BM25 = True
+    from scipy.sparse import csr_matrix
+    from sklearn.feature_extraction.text import CountVectorizer
+    HAS_SKLEARN = True
 except ImportError:
-    HAS_BM25 = False
-    print("⚠️  rank_bm25 not installed — pip install rank_bm25")
+    HAS_SKLEARN = False
 
 
-def bm25_score(query: str, texts: list[str]) -> np.ndarray:
+def bm25_score(
+    query:   str,
+    texts:   list[str],
+    k1:      float = 1.5,
+    b:       float = 0.75,
+    epsilon: float = 0.25,
+) -> np.ndarray:
     """
     Score each text against the query using BM25Okapi.
 
     BM25 is a classic lexical retrieval model that rewards
     term frequency while penalising very long documents.
-    Returns a zero array if rank_bm25 is not installed.
+
+    Scores equal rank_bm25.BM25Okapi(...).get_scores() (same tokenisation,
+    defaults and IDF floor), but document frequencies are counted in C and
+    only the query's own terms get per-document term frequencies, instead of
+    building a full per-document frequency dict in Python.
+
+    Scores are float32: they only feed a top-k selection, and the per-term
+    arrays move half the bytes of float64.
     """
-    if not HAS_BM25 or not texts:
-        return np.zeros(len(texts))
+    if not texts:
+        return np.zeros(len(texts), dtype=np.float32)
+
+    docs, df, floor, norm = _bm25_stats(texts, k1, b, epsilon)
+    n_docs  = len(docs)
+    q_terms = Counter(query.split())
+    if not df or not q_terms:
+        return np.zeros(n_docs, dtype=np.float32)
+
+    scores = np.zeros(n_docs, dtype=np.float32)
+    for term, count in q_terms.items():
+        n_t = df.get(term)
+        if not n_t:
+            continue   # unseen terms have no IDF and add nothing
+        idf = np.log(n_docs - n_t + 0.5) - np.log(n_t + 0.5)
+        if idf < 0:
+            idf = floor
+        tf = np.fromiter((d.count(term) for d in docs), dtype=np.float32, count=n_docs)
+        scores += np.float32(count * idf) * (tf * np.float32(k1 + 1) / (tf + norm))
+    return scores
+
+
+# Tokenised texts and their query-independent BM25 statistics, for the last
+# few text sets scored. Keyed on the texts' content (as a tuple), so a list
+# rebuilt for the same candidates — the same filters on a later query, or the
+# full corpus when scikit-learn is missing — hits the cache. The engine's
+# strings come from one shared cache, so their hashes are already computed and
+# building the key is a single pass over references.
+_BM25_STATS_CACHE_SIZE = 16
+
+_bm25_stats_cache: OrderedDict = OrderedDict()
+_bm25_stats_lock = threading.Lock()
+
+
+def _bm25_stats(texts: list[str], k1: float, b: float, epsilon: float) -> tuple:
+    """(docs, df, idf_floor, length_norm) for *texts*, memoised on their content."""
+    key = (tuple(texts), k1, b, epsilon)
+    with _bm25_stats_lock:
+        stats = _bm25_stats_cache.get(key)
+        if stats is not None:
+            _bm25_stats_cache.move_to_end(key)
+            return stats
+
+    docs   = [t.split() for t in texts]
+    n_docs = len(docs)
+    df     = Counter(chain.from_iterable(map(set, docs)))
+    floor  = norm = None
+    if df:
+        # IDF floor: negative values become epsilon × mean IDF over the whole vocabulary
+        all_df = np.fromiter(df.values(), dtype=np.float64, count=len(df))
+        floor  = epsilon * (np.log(n_docs - all_df + 0.5) - np.log(all_df + 0.5)).mean()
+
+        doc_len = np.fromiter(map(len, docs), dtype=np.float64, count=n_docs)
+        norm    = (k1 * (1 - b + b * doc_len / doc_len.mean())).astype(np.float32)
+
+    stats = (docs, df, floor, norm)
+    with _bm25_stats_lock:
+        _bm25_stats_cache[key] = stats
+        while len(_bm25_stats_cache) > _BM25_STATS_CACHE_SIZE:
+            _bm25_stats_cache.popitem(last=False)
+    return stats
+
+
+class BM25Vectorizer:
+    """
+    Corpus-level BM25Okapi index, fitted once and reused for every query.
+
+    Per-document term weights (IDF × k1/b term-frequency saturation) are
+    precomputed into a sparse CSR matrix, so scoring a query is a single
+    sparse matrix-vector product instead of a Python loop over the corpus.
+    Uses the same whitespace tokenisation, IDF floor and defaults as
+    rank_bm25.BM25Okapi, so scores match bm25_score() on the same texts.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1      = k1
+        self.b       = b
+        self.epsilon = epsilon
+        self.vectorizer  = None
+        self.matrix      = None   # (n_docs, vocab) CSR of BM25 term weights
+        self.fingerprint = None   # caller's corpus fingerprint, kept by save() / load()
 
-    tokenized = [t.split() for t in texts]
-    bm25      = BM25Okapi(tokenized)
-    return bm25.get_scores(query.split())
+    def fit(self, texts: list[str]) -> "BM25Vectorizer":
+        # Counts are built as float64 directly — no int64 matrix plus cast copy
+        self.vectorizer = CountVectorizer(
+            tokenizer=str.split, lowercase=False, token_pattern=None, dtype=np.float64,
+        )
+        tf = self.vectorizer.fit_transform(texts).tocsr()
+
+        n_docs  = tf.shape[0]
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avgdl   = doc_len.mean()
+
+        # IDF with rank_bm25's floor: negative values become epsilon × mean IDF
+        df  = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        idf[idf < 0] = self.epsilon * idf.mean()
+
+        # Saturate every non-zero tf in place
+        rows    = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        norm    = self.k1 * (1 - self.b + self.b * doc_len[rows] / avgdl)
+        tf.data = idf[tf.indices] * tf.data * (self.k1 + 1) / (tf.data + norm)
+
+        self.matrix = tf
+        return self
+
+    def score(self, query: str) -> np.ndarray:
+        """Return the BM25 score of every fitted document for *query*."""
+        q_vec = self.vectorizer.transform([query])
+        return (self.matrix @ q_vec.T).toarray().ravel()
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+    # The CSR arrays are stored as plain .npy files so they can be memory-mapped
+    # on load; the vocabulary, matrix shape and fingerprint go into a JSON sidecar.
+
+    _ARRAYS = ("data", "indices", "indptr")
+
+    @classmethod
+    def files(cls, prefix: str) -> list[str]:
+        """All files written by save(*prefix*)."""
+        return [f"{prefix}_{name}.npy" for name in cls._ARRAYS] + [f"{prefix}_vocab.json"]
+
+    def save(self, prefix: str) -> None:
+        for name in self._ARRAYS:
+            np.save(f"{prefix}_{name}.npy", getattr(self.matrix, name))
+        meta = {
+            "shape":       list(self.matrix.shape),
+            "fingerprint": self.fingerprint,
+            "vocabulary":  {t: int(i) for t, i in self.vectorizer.vocabulary_.items()},
+        }
+        with open(f"{prefix}_vocab.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str) -> "BM25Vectorizer":
+        """Load a saved index, memory-mapping the matrix arrays."""
+        with open(f"{prefix}_vocab.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(f"{prefix}_{name}.npy", mmap_mode="r") for name in cls._ARRAYS]
+
+        self = cls()
+        self.vectorizer = CountVectorizer(
+            tokenizer=str.split, lowercase=False, token_pattern=None,
+            vocabulary=meta["vocabulary"],
+        )
+        self.matrix      = csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+        self.fingerprint = meta.get("fingerprint")
+        return self
 
 
 def reciprocal_rank_fusion(rank_lists: list[list], k: int = 60) -> dict:
@@ -41,8 +201,33 @@ def reciprocal_rank_fusion(rank_lists: list[list], k: int = 60) -> dict:
     Returns:
         {doc_id: rrf_score} — higher is better
     """
-    scores: dict = {}
-    for ranked_list in rank_lists:
-        for rank, doc_id in enumerate(ranked_list):
-            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
-    return scores
\ No newline at end of file
+    ids, scores = _rrf_totals(rank_lists, k)
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+def rrf_top_ids(rank_lists: list[list], limit: int, k: int = 60) -> list:
+    """
+    The *limit* best doc ids under reciprocal_rank_fusion(), best first.
+    Ties keep first-appearance order (as sorting the fused dict would),
+    and no intermediate dict is built.
+    """
+    ids, scores = _rrf_totals(rank_lists, k)
+    return ids[np.argsort(-scores, kind="stable")[:limit]].tolist()
+
+
+def _rrf_totals(rank_lists: list[list], k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct doc ids (first-appearance order) and their summed RRF scores."""
+    if not rank_lists:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    # One bincount over the concatenated lists replaces the per-id dict updates;
+    # it adds the weights in list order, so the sums match the dict loop exactly.
+    # ids are typed explicitly: an empty list would otherwise come back float64
+    # and turn every id in the concatenation into a float
+    ids     = np.concatenate([np.asarray(lst, dtype=np.int64) for lst in rank_lists])
+    weights = np.concatenate([1.0 / (k + np.arange(1, len(lst) + 1)) for lst in rank_lists])
+    uniq, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    totals  = np.bincount(inverse, weights=weights, minlength=len(uniq))
+
+    order = np.argsort(first)
+    return uniq[order], totals[order]
\ No newline at end of file
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+
+import pytest
+
+from search_pipeline import database
+
+_COLUMNS = ("id", "title", "doc_type", "degree", "year", "university",
+            "authors", "advisors", "co_advisors", "abs_text", "keyword_text", "subject")
+
+_ROWS = [
+    (1, "یادگیری عمیق", "پایان‌نامه", "کارشناسی ارشد", 1399, "دانشگاه تهران",
+     "علیرضا احمدی", "محمدرضا کریمی", None, "چکیده", "شبکه", None),
+    (2, "بینایی ماشین", "پایان‌نامه", "دکتری", 1401, "دانشگاه بین‌المللی امام خمینی",
+     "زهرا رضایی", "حسین محمدی", "رضا نوری", "چکیده", "تصویر", None),
+    (3, "پردازش زبان", "رساله", "دکتری", 1395, "دانشگاه صنعتی شریف",
+     "مریم حسینی", "رضا کریمی‌نژاد", None, None, "متن", None),
+]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """database module pointed at a fresh three-row documents table."""
+    path = tmp_path / "docs.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE documents (id INTEGER, title TEXT, doc_type TEXT, degree TEXT, "
+        "year INTEGER, university TEXT, authors TEXT, advisors TEXT, co_advisors TEXT, "
+        "abs_text TEXT, keyword_text TEXT, subject TEXT)"
+    )
+    conn.executemany(f"INSERT INTO documents VALUES ({', '.join('?' * len(_COLUMNS))})", _ROWS)
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, "DB_PATH", str(path))
+    monkeypatch.setattr(database, "_local", threading.local())
+    for name in ("_cached_columns", "_cached_schema", "_fts_columns", "_PERSON_FALLBACKS",
+                 "_FULL_DOC_SQL_TEMPLATE", "_version_conn", "_filters_db_version"):
+        monkeypatch.setattr(database, name, None)
+    database._apply_filters_cached.cache_clear()
+    yield database
+    database._apply_filters_cached.cache_clear()
+
+
+def _ids(db, filters, join_operator="AND"):
+    return sorted(db.apply_filters(filters, join_operator)["ids"].tolist())
+
+
+# Substring filters, including partial names, ZWNJ-joined forms and matches
+# inside a word — all of which LIKE '%x%' finds
+_SUBSTRING_CASES = [
+    ({"university": "تهران"},            [1]),
+    ({"university": "بین‌المللی"},        [2]),
+    ({"university": "المللی"},           [2]),
+    ({"university": "صنعتی"},            [3]),
+    ({"authors": "رضا"},                 [1, 2]),
+    ({"authors": "احمد"},                [1]),
+    ({"advisors": "کریمی"},              [1, 3]),
+    ({"advisors": "رضا"},                [1, 3]),
+    ({"co_advisors": "نوری"},            [2]),
+    ({"authors": "رض"},                  [1, 2]),    # shorter than a trigram
+    ({"university": ["تهران", "شریف"]},  [1, 3]),
+    ({"university": "دانشگاه", "degree": "دکتری"}, [2, 3]),
+]
+
+
+@pytest.mark.parametrize("filters, expected", _SUBSTRING_CASES)
+def test_filters_match_substrings_before_and_after_migrate(db, filters, expected):
+    assert _ids(db, filters) == expected
+
+    db.migrate()
+    db._fts_columns = None
+    db._apply_filters_cached.cache_clear()
+    assert db._ensure_fts() >= {"university", "authors", "advisors", "co_advisors"}
+    assert _ids(db, filters) == expected
+
+
+def test_fts_index_follows_row_changes(db):
+    db.migrate()
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("UPDATE documents SET university = 'دانشگاه فردوسی مشهد' WHERE id = 1")
+    conn.execute("INSERT INTO documents (id, title, university) VALUES (4, 'تست', 'دانشگاه فردوسی')")
+    conn.execute("DELETE FROM documents WHERE id = 3")
+    conn.commit()
+
+    def fts_ids(pattern):
+        return sorted(row[0] for row in conn.execute(
+            "SELECT rowid FROM documents_fts WHERE university LIKE ?", (pattern,)))
+
+    assert fts_ids("%فردوسی%") == [1, 4]
+    assert fts_ids("%تهران%") == []
+    assert fts_ids("%شریف%") == []
+    conn.close()
+
+
+def test_filter_cache_sees_wal_commits(db):
+    assert _ids(db, {"university": "شریف"}) == [3]
+
+    # A WAL commit from another connection leaves the main file's mtime alone
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("INSERT INTO documents (id, title, university) VALUES (4, 'تست', 'دانشگاه صنعتی شریف')")
+    conn.commit()
+    assert _ids(db, {"university": "شریف"}) == [3, 4]
+
+    conn.execute("DELETE FROM documents WHERE id = 3")
+    conn.commit()
+    assert _ids(db, {"university": "شریف"}) == [4]
+    conn.close()
+
+
+def test_filter_cache_sees_own_process_writes(db):
+    assert _ids(db, {"authors": "مریم"}) == [3]
+    db._get_conn().execute("UPDATE documents SET authors = 'مریم صادقی' WHERE id = 1")
+    assert _ids(db, {"authors": "مریم"}) == [1, 3]
+
+
+def test_migrate_is_idempotent(db):
+    db.migrate()
+    conn    = sqlite3.connect(db.DB_PATH)
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    db.migrate()
+    assert conn.execute("PRAGMA data_version").fetchone()[0] == version
+    conn.close()
+
+
+def test_fetch_full_docs_coalesces_nulls_without_migrating(db):
+    docs = db.fetch_full_docs([3, 1])
+    assert [d["id"] for d in docs] == [3, 1]
+    assert docs[0]["abs_text"] == "" and docs[0]["co_advisors"] == ""
+
+    conn = sqlite3.connect(db.DB_PATH)
+    assert conn.execute("SELECT count(*) FROM documents WHERE abs_text IS NULL").fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+import pytest
+
+from search_pipeline import models as models_module
+
+_REGISTRY = {
+    "a": {"model": "ce-a", "label": "A"},
+    "b": {"model": "ce-b", "label": "B"},
+    "c": {"model": "ce-c", "label": "C"},
+}
+
+
+class FakeCrossEncoder:
+    def __init__(self, name: str):
+        self.name   = name
+        self.device = "cuda"
+
+
+def _move(model, device):
+    model.device = device
+    return True
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Models with fake cross-encoders that record the device they sit on (GPU host)."""
+    monkeypatch.setattr(models_module, "CROSS_ENCODER_REGISTRY", _REGISTRY)
+    monkeypatch.setattr(models_module, "DEFAULT_CROSS_ENCODER", "a")
+    monkeypatch.setattr(models_module, "_load_bi_encoder", lambda name, use_onnx=False: None)
+    monkeypatch.setattr(models_module, "_load_cross_encoder",
+                        lambda name, use_onnx=False: FakeCrossEncoder(name))
+    monkeypatch.setattr(models_module, "_move_cross_encoder", _move)
+    monkeypatch.setattr(models_module, "_release_gpu_memory", lambda: None)
+    monkeypatch.setattr(models_module.torch.cuda, "is_available", lambda: True)
+    return models_module.Models(use_onnx=False)
+
+
+def test_swap_waits_for_a_rerank_in_flight(models):
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def predict(ce, pairs):
+        started.set()
+        release.wait(5)
+        seen.append((ce.name, ce.device))   # state after the "forward pass"
+        return np.zeros(len(pairs), dtype="float32")
+
+    models._predict = predict
+    rerank = threading.Thread(target=models.rerank, args=("q", [{"title": "t"}]))
+    rerank.start()
+    assert started.wait(5)
+
+    swap = threading.Thread(target=models.set_cross_encoder, args=("b",))
+    swap.start()
+    swap.join(0.2)
+    assert swap.is_alive()            # the outgoing model is still in use
+    assert models._ce_key == "b"      # but new requests already get the new one
+
+    release.set()
+    rerank.join(5)
+    swap.join(5)
+    assert seen == [("ce-a", "cuda")]
+    assert models._ce_parked["a"].device == "cpu"
+
+
+def test_concurrent_reranks_and_swaps(models):
+    errors = []
+
+    def predict(ce, pairs):
+        if ce.device != "cuda":
+            errors.append(f"{ce.name} scored on {ce.device}")
+        return np.full(len(pairs), ord(ce.name[-1]), dtype="float32")
+
+    models._predict = predict
+    stop = threading.Event()
+
+    def reranker(worker):
+        i = 0
+        while not stop.is_set():
+            i += 1
+            ranked = models.rerank(f"q{worker}-{i}", [{"title": "t"}])
+            # The score identifies the model that produced it; it must be a real one
+            if ranked[0][1] not in (ord("a"), ord("b"), ord("c")):
+                errors.append(f"unexpected score {ranked[0][1]}")
+
+    workers = [threading.Thread(target=reranker, args=(w,)) for w in range(4)]
+    for t in workers:
+        t.start()
+    try:
+        for key in ["b", "c", "a", "b", "a", "c"] * 5:
+            models.set_cross_encoder(key)
+            assert models.cross_encoder.device == "cuda"
+    finally:
+        stop.set()
+        for t in workers:
+            t.join(5)
+
+    assert not errors
+    assert not any(models._ce_users.values())
+    assert len(models._ce_parked) == models_module.CE_RESIDENT_MODELS - 1
+
+
+def test_rerank_scores_are_cached_per_model(models):
+    calls = []
+
+    def predict(ce, pairs):
+        calls.append(ce.name)
+        return np.full(len(pairs), ord(ce.name[-1]), dtype="float32")
+
+    models._predict = predict
+    docs = [{"title": "t"}]
+    assert models.rerank("q", docs)[0][1] == ord("a")
+    assert models.rerank("q", docs)[0][1] == ord("a")
+    models.set_cross_encoder("b")
+    assert models.rerank("q", docs)[0][1] == ord("b")
+    assert calls == ["ce-a", "ce-b"]
+
+
+class _GpuSearchFails:
+    def search(self, q_vecs, k, params=None):
+        raise RuntimeError("k > 2048 not supported")
+
+
+def _flat_index(n=50, d=8):
+    vecs  = np.random.default_rng(0).standard_normal((n, d)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    index = models_module.faiss.IndexFlatIP(d)
+    index.add(vecs)
+    return index, vecs
+
+
+def test_dense_search_falls_back_to_cpu_index(models):
+    models.index, vecs = _flat_index()
+    models.gpu_index   = _GpuSearchFails()
+    assert models.dense_search(vecs[:2], 3)[:, 0].tolist() == [0, 1]
+
+
+def test_dense_search_clamps_refine_shortlist(models, monkeypatch):
+    faiss = models_module.faiss
+    _, vecs = _flat_index()
+    refine  = faiss.IndexRefineFlat(faiss.IndexFlatIP(vecs.shape[1]))
+    refine.add(vecs)
+    refine.k_factor = models_module.IVF_REFINE_K
+    shortlist = []
+
+    class RecordingIndex(faiss.IndexRefineFlat):
+        def search(self, q_vecs, k, params=None):
+            factor = params.k_factor if params is not None else self.k_factor
+            shortlist.append(k * factor)
+            return refine.search(q_vecs, k, params=params)
+
+    monkeypatch.setattr(models_module, "GPU_MAX_K", 20)
+    models.index, models.gpu_index = refine, RecordingIndex(faiss.IndexFlatIP(vecs.shape[1]))
+    models.gpu_index.k_factor = models_module.IVF_REFINE_K
+    models.dense_search(vecs[:1], 5)
+    assert shortlist == [20]
+    assert refine.k_factor == models_module.IVF_REFINE_K
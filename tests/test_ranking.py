@@ -0,0 +1,26 @@
+from search_pipeline.ranking import reciprocal_rank_fusion, rrf_top_ids
+
+
+def test_rrf_top_ids_with_empty_list_keeps_int_ids():
+    top = rrf_top_ids([[5, 3], []], 5)
+    assert top == [5, 3]
+    assert all(type(doc_id) is int for doc_id in top)
+
+
+def test_rrf_with_empty_list_keeps_int_keys():
+    fused = reciprocal_rank_fusion([[], [7, 2, 9]])
+    assert list(fused) == [7, 2, 9]
+    assert all(type(doc_id) is int for doc_id in fused)
+
+
+def test_rrf_all_lists_empty():
+    assert rrf_top_ids([[], []], 5) == []
+    assert reciprocal_rank_fusion([[], []]) == {}
+
+
+def test_rrf_top_ids_matches_sorted_fusion():
+    lists = [[1, 2, 3, 4], [4, 3, 9]]
+    fused = reciprocal_rank_fusion(lists)
+    expected = sorted(fused, key=lambda d: -fused[d])
+    assert rrf_top_ids(lists, 10) == expected
+    assert rrf_top_ids(lists, 2) == expected[:2]